@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Post, Group
+from .models import Job, Post, Group
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,5 +16,12 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = "-пусто-"
 
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("task", "status", "priority", "attempts", "run_at")
+    list_filter = ("status", "task")
+    search_fields = ("task", "key")
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
+admin.site.register(Job, JobAdmin)
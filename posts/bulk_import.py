@@ -0,0 +1,321 @@
+"""Массовый импорт постов, комментариев и подписок из JSONL.
+
+Одна строка — один JSON-объект:
+
+    посты:        {"id": 10, "author": "leo", "text": "...",
+                   "group": "cats", "image": "posts/a.jpg",
+                   "pub_date": "2020-01-01T10:00:00+00:00"}
+    комментарии:  {"post": 10, "author": "tolstoy", "text": "...",
+                   "created": "2020-01-02T10:00:00+00:00"}
+    подписки:     {"user": "tolstoy", "author": "leo"}
+
+Необязательны `group`, `image`, `id` и даты. Файл читается потоком,
+строки вставляются пачками bulk_create, каждая пачка — отдельная
+транзакция вместе с контрольной точкой, поэтому прерванный импорт
+продолжается с первой незаписанной строки. Сигналы при bulk_create
+не срабатывают, так что счётчики, поисковый индекс, ленты и поколения
+кеша обновляются здесь же, одним-двумя запросами на пачку.
+"""
+import itertools
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import search, thumbnails, timeline
+from .counters import (
+    reconcile_comment_counts, repair_group_stats, repair_user_stats,
+)
+from .feed_cache import bump_generation, post_scopes
+from .models import Comment, Follow, Group, ImportCheckpoint, Post, User
+
+
+@contextmanager
+def keep_timestamps(model, name):
+    """Снимает auto_now_add с поля на время bulk_create, чтобы даты
+    из выгрузки не заменялись текущим временем."""
+    field = model._meta.get_field(name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def parse_timestamp(value):
+    if not value:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'неверная дата: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+def next_id(model):
+    """Первый свободный id таблицы с учётом sqlite_sequence, чтобы
+    не выдать заново id удалённой записи."""
+    top = model.objects.aggregate(top=Max('pk'))['top'] or 0
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s',
+                           [model._meta.db_table])
+            row = cursor.fetchone()
+        if row:
+            top = max(top, row[0])
+    return top + 1
+
+
+class Importer:
+    kind = None
+
+    def __init__(self, chunk_size=500, create_users=False):
+        self.chunk_size = chunk_size
+        self.create_users = create_users
+        self.users = dict(User.objects.values_list('username', 'id'))
+        self.line = 0
+        self.inserted = 0
+        self.skipped = 0
+
+    def resolve_users(self, usernames):
+        """Дополняет карту имён; с create_users заводит незнакомых
+        пользователей без пароля (войти можно после сброса пароля)."""
+        missing = {name for name in usernames if name not in self.users}
+        if not missing or not self.create_users:
+            return
+        User.objects.bulk_create(
+            [User(username=name, password=make_password(None))
+             for name in sorted(missing)],
+            ignore_conflicts=True,
+        )
+        self.users.update(
+            User.objects.filter(username__in=missing)
+            .values_list('username', 'id')
+        )
+
+    def run(self, path, restart=False, progress=None):
+        """Импортирует файл, вызывая `progress(importer, seconds)` после
+        каждой пачки. Возвращает число добавленных записей."""
+        source = f'{self.kind}:{os.path.abspath(path)}'
+        if restart:
+            ImportCheckpoint.objects.filter(source=source).delete()
+        self.line = ImportCheckpoint.objects.filter(
+            source=source
+        ).values_list('line', flat=True).first() or 0
+        started = time.monotonic()
+        chunk = []
+        last_line = self.line
+        with open(path, encoding='utf-8') as file:
+            numbered = enumerate(itertools.islice(file, self.line, None),
+                                 self.line + 1)
+            for last_line, text in numbered:
+                if text.strip():
+                    chunk.append(self.parse(last_line, text))
+                if len(chunk) >= self.chunk_size:
+                    self.commit(source, chunk, last_line)
+                    chunk = []
+                    if progress:
+                        progress(self, time.monotonic() - started)
+        if last_line > self.line:
+            self.commit(source, chunk, last_line)
+            if progress:
+                progress(self, time.monotonic() - started)
+        return self.inserted
+
+    def parse(self, number, text):
+        try:
+            record = json.loads(text)
+            if not isinstance(record, dict):
+                raise ValueError('ожидается объект')
+            return self.validate(record)
+        except (ValueError, KeyError, TypeError) as error:
+            raise ValueError(f'строка {number}: {error}') from error
+
+    def validate(self, record):
+        return record
+
+    def commit(self, source, records, line):
+        with transaction.atomic():
+            # Контрольная точка пишется первой: на SQLite это сразу берёт
+            # блокировку на запись, и next_id() ни с кем не гоняется.
+            ImportCheckpoint.objects.update_or_create(
+                source=source, defaults={'line': line}
+            )
+            if records:
+                self.insert(records)
+        self.line = line
+
+    def insert(self, records):
+        raise NotImplementedError
+
+
+class PostImporter(Importer):
+    kind = 'posts'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+
+    def validate(self, record):
+        if record.get('id') is not None:
+            record['id'] = int(record['id'])
+        record['author'] = str(record['author'])
+        record['text'] = str(record['text'])
+        record['pub_date'] = parse_timestamp(record.get('pub_date'))
+        return record
+
+    def insert(self, records):
+        self.resolve_users(record['author'] for record in records)
+        posts = []
+        for record in records:
+            author_id = self.users.get(record['author'])
+            slug = record.get('group')
+            group_id = self.groups.get(slug) if slug else None
+            if author_id is None or (slug and group_id is None):
+                self.skipped += 1
+                continue
+            post = Post(
+                id=record.get('id'),
+                author_id=author_id,
+                group_id=group_id,
+                text=record['text'],
+                image=record.get('image') or None,
+                pub_date=record['pub_date'],
+            )
+            posts.append(post)
+        if not posts:
+            return
+        if not connection.features.can_return_ids_from_bulk_insert:
+            # SQLite не возвращает id из bulk_create, а они нужны
+            # индексу и лентам, поэтому id раздаются заранее.
+            start = max([next_id(Post)] + [post.id + 1 for post in posts
+                                           if post.id is not None])
+            fresh = (post for post in posts if post.id is None)
+            for number, post in enumerate(fresh, start):
+                post.id = number
+        with keep_timestamps(Post, 'pub_date'):
+            Post.objects.bulk_create(posts)
+        self.inserted += len(posts)
+
+        post_ids = [post.id for post in posts]
+        if search.enabled():
+            search.index_posts(post_ids)
+        timeline.fan_out_posts(post_ids)
+        repair_user_stats({post.author_id for post in posts})
+        repair_group_stats({post.group_id for post in posts if post.group_id})
+        bump_generation(*{
+            scope for post in posts
+            for scope in post_scopes(post.author_id, post.group_id)
+        })
+        for name in {post.image.name for post in posts if post.image}:
+            thumbnails.schedule(name)
+
+
+class CommentImporter(Importer):
+    kind = 'comments'
+
+    def validate(self, record):
+        record['post'] = int(record['post'])
+        record['author'] = str(record['author'])
+        record['text'] = str(record['text'])
+        record['created'] = parse_timestamp(record.get('created'))
+        return record
+
+    def insert(self, records):
+        self.resolve_users(record['author'] for record in records)
+        posts = {
+            post['id']: post for post in Post.objects.filter(
+                id__in={record['post'] for record in records}
+            ).values('id', 'author_id', 'group_id')
+        }
+        comments = []
+        for record in records:
+            author_id = self.users.get(record['author'])
+            if author_id is None or record['post'] not in posts:
+                self.skipped += 1
+                continue
+            comment = Comment(
+                post_id=record['post'],
+                author_id=author_id,
+                text=record['text'],
+                created=record['created'],
+            )
+            comments.append(comment)
+        if not comments:
+            return
+        with keep_timestamps(Comment, 'created'):
+            Comment.objects.bulk_create(comments)
+        self.inserted += len(comments)
+
+        post_ids = {comment.post_id for comment in comments}
+        reconcile_comment_counts(post_ids)
+        repair_user_stats({comment.author_id for comment in comments})
+        bump_generation(*{
+            scope for post_id in post_ids
+            for scope in post_scopes(posts[post_id]['author_id'],
+                                     posts[post_id]['group_id'],
+                                     post_id=post_id)
+        })
+
+
+class FollowImporter(Importer):
+    kind = 'follows'
+
+    def validate(self, record):
+        record['user'] = str(record['user'])
+        record['author'] = str(record['author'])
+        return record
+
+    def insert(self, records):
+        self.resolve_users(
+            name for record in records
+            for name in (record['user'], record['author'])
+        )
+        pairs = set()
+        for record in records:
+            user_id = self.users.get(record['user'])
+            author_id = self.users.get(record['author'])
+            if user_id is not None and author_id not in (None, user_id):
+                pairs.add((user_id, author_id))
+        user_ids = {user_id for user_id, _ in pairs}
+        author_ids = {author_id for _, author_id in pairs}
+        existing = {
+            (user_id, author_id): follow_id
+            for follow_id, user_id, author_id in Follow.objects.filter(
+                user_id__in=user_ids, author_id__in=author_ids
+            ).values_list('id', 'user_id', 'author_id')
+        }
+        new = pairs - existing.keys()
+        self.skipped += len(records) - len(new)
+        if not new:
+            return
+        Follow.objects.bulk_create(
+            [Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in sorted(new)],
+        )
+        self.inserted += len(new)
+
+        follow_ids = [
+            follow_id
+            for follow_id, user_id, author_id in Follow.objects.filter(
+                user_id__in=user_ids, author_id__in=author_ids
+            ).values_list('id', 'user_id', 'author_id')
+            if (user_id, author_id) in new
+        ]
+        timeline.backfill_follows(follow_ids)
+        repair_user_stats(user_ids | author_ids)
+        # Ленты подписок сбрасывает backfill_follows.
+        bump_generation(*{f'followers:{author_id}' for _, author_id in new})
+
+
+IMPORTERS = {
+    importer.kind: importer
+    for importer in (PostImporter, CommentImporter, FollowImporter)
+}
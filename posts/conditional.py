@@ -0,0 +1,67 @@
+import hashlib
+
+from . import group_cache
+from .feed_cache import get_generation, read_fresh
+from .models import User
+
+
+def scoped_etag(scopes):
+    """etag_func для `django.views.decorators.http.etag`.
+
+    Валидатор строится из поколений кеша областей, которые возвращает
+    `scopes(request, **kwargs)`: поколение меняется при любой записи,
+    влияющей на страницу, и проверка стоит пару чтений из кеша.
+    В ETag входят полный путь и id пользователя, поэтому у разных
+    пользователей и страниц ленты валидаторы не совпадают. Остаток
+    запроса читает только с реплик, видящих записи в эти области.
+    """
+    def etag_func(request, *args, **kwargs):
+        names = scopes(request, *args, **kwargs)
+        if names is None:
+            return None
+        read_fresh(names)
+        parts = [request.get_full_path(), str(request.user.pk or '')]
+        parts.extend(f'{name}={get_generation(name)}' for name in names)
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return etag_func
+
+
+def viewer_scopes(request):
+    if request.user.is_authenticated:
+        return [f'follow:{request.user.pk}']
+    return []
+
+
+def index_scopes(request):
+    return ['index'] + viewer_scopes(request)
+
+
+def group_scopes(request, slug):
+    group = group_cache.get_group(slug)
+    if group is None:
+        return None
+    return [f'group:{group.id}'] + viewer_scopes(request)
+
+
+def profile_scopes(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [
+        f'author:{author_id}',
+        f'follow:{author_id}',
+        f'followers:{author_id}',
+    ] + viewer_scopes(request)
+
+
+def post_page_scopes(request, username, post_id):
+    return [f'post:{post_id}']
+
+
+index_etag = scoped_etag(index_scopes)
+follow_etag = scoped_etag(index_scopes)
+group_etag = scoped_etag(group_scopes)
+profile_etag = scoped_etag(profile_scopes)
+post_etag = scoped_etag(post_page_scopes)
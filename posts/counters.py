@@ -0,0 +1,142 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, GroupStats, Post, User, UserStats
+
+
+def count_subquery(queryset, field):
+    """Подзапрос COUNT(*) по `field`, связанному с внешним pk."""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile_comment_counts(post_ids=None):
+    """Пересчитывает Post.comment_count одним UPDATE (всех постов
+    или только `post_ids`)."""
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    return posts.update(
+        comment_count=count_subquery(Comment.objects.all(), 'post')
+    )
+
+
+def compute_user_stats(user_id):
+    return {
+        'followers': Follow.objects.filter(author_id=user_id).count(),
+        'following': Follow.objects.filter(user_id=user_id).count(),
+        'posts': Post.objects.filter(author_id=user_id).count(),
+        'comments': Comment.objects.filter(author_id=user_id).count(),
+    }
+
+
+def bump_user_stats(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя: bump_user_stats(1, posts=1).
+
+    Строка статистики создаётся при первом чтении профиля, до этого
+    сдвигать нечего. Счётчики не уходят ниже нуля.
+    """
+    queryset = UserStats.objects.filter(user_id=user_id)
+    for name, delta in deltas.items():
+        if delta < 0:
+            queryset = queryset.filter(**{f'{name}__gte': -delta})
+    queryset.update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+
+
+def get_user_stats(user):
+    stats = UserStats.objects.filter(user=user).first()
+    if stats is None:
+        stats, _ = UserStats.objects.get_or_create(
+            user=user, defaults=compute_user_stats(user.pk)
+        )
+    return stats
+
+
+def repair_user_stats(user_ids=None):
+    """Пересчитывает UserStats пакетно: для всех пользователей
+    или только для `user_ids`."""
+    users = User.objects.all()
+    stats = UserStats.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+    existing = UserStats.objects.values_list('user_id', flat=True)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in
+         users.exclude(pk__in=existing).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    return stats.update(
+        followers=count_subquery(Follow.objects.all(), 'author'),
+        following=count_subquery(Follow.objects.all(), 'user'),
+        posts=count_subquery(Post.objects.all(), 'author'),
+        comments=count_subquery(Comment.objects.all(), 'author'),
+    )
+
+
+def latest_group_post(field='id'):
+    """Подзапрос: `field` самого свежего поста группы из внешней строки."""
+    return Subquery(
+        Post.objects.filter(group=OuterRef('pk')).order_by(
+            '-pub_date', '-id'
+        ).values(field)[:1]
+    )
+
+
+def bump_group_stats(group_id, posts=0, latest=None, touch=True):
+    """Сдвигает счётчик постов группы и отмечает активность в ней.
+
+    `latest` становится превью группы, если он не старше текущего.
+    """
+    if not group_id:
+        return
+    changes = {}
+    if touch:
+        changes['last_activity'] = timezone.now()
+    stats = GroupStats.objects.filter(group_id=group_id)
+    if posts:
+        changes['posts'] = F('posts') + posts
+        if posts < 0:
+            stats = stats.filter(posts__gte=-posts)
+    if changes:
+        stats.update(**changes)
+    if latest is not None:
+        GroupStats.objects.filter(group_id=group_id).filter(
+            Q(latest_post__isnull=True)
+            | Q(latest_post__pub_date__lte=latest.pub_date)
+        ).update(latest_post=latest)
+
+
+def refresh_latest_post(group_id, post_id):
+    """Ищет новое превью, если пост `post_id` ушёл из группы
+    (после удаления поста ссылка на него уже обнулена)."""
+    if not group_id:
+        return
+    GroupStats.objects.filter(group_id=group_id).filter(
+        Q(latest_post__isnull=True) | Q(latest_post_id=post_id)
+    ).update(latest_post=latest_group_post())
+
+
+def repair_group_stats(group_ids=None):
+    """Пересчитывает GroupStats пакетно: для всех групп или `group_ids`."""
+    groups = Group.objects.all()
+    stats = GroupStats.objects.all()
+    if group_ids is not None:
+        groups = groups.filter(pk__in=group_ids)
+        stats = stats.filter(group_id__in=group_ids)
+    existing = GroupStats.objects.values_list('group_id', flat=True)
+    GroupStats.objects.bulk_create(
+        [GroupStats(group_id=group_id) for group_id in
+         groups.exclude(pk__in=existing).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    return stats.update(
+        posts=count_subquery(Post.objects.all(), 'group'),
+        latest_post=latest_group_post(),
+        last_activity=latest_group_post('pub_date'),
+    )
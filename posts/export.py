@@ -0,0 +1,80 @@
+"""Потоковая выгрузка постов и комментариев пользователя.
+
+Записи читаются из базы `.iterator()` пачками и сразу кодируются
+в JSONL или CSV и при необходимости сжимаются gzip, так что в памяти
+никогда не лежит больше одной пачки, сколько бы постов ни было.
+"""
+import csv
+import json
+import zlib
+
+FORMATS = ('jsonl', 'csv')
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+COLUMNS = ('type', 'id', 'post_id', 'date', 'group', 'text', 'image')
+
+
+def records(author, chunk_size=2000):
+    """Сначала посты, потом комментарии автора, каждые по возрастанию id."""
+    posts = author.posts.order_by('id').values_list(
+        'id', 'pub_date', 'group__slug', 'text', 'image'
+    )
+    for post_id, pub_date, group, text, image in posts.iterator(chunk_size):
+        yield {
+            'type': 'post', 'id': post_id, 'post_id': post_id,
+            'date': pub_date.isoformat(), 'group': group, 'text': text,
+            'image': image or None,
+        }
+    comments = author.comments.order_by('id').values_list(
+        'id', 'post_id', 'created', 'text'
+    )
+    for comment_id, post_id, created, text in comments.iterator(chunk_size):
+        yield {
+            'type': 'comment', 'id': comment_id, 'post_id': post_id,
+            'date': created.isoformat(), 'group': None, 'text': text,
+            'image': None,
+        }
+
+
+def encode_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку, а не пишет."""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow(
+            ['' if row[name] is None else row[name] for name in COLUMNS]
+        )
+
+
+def gzip_stream(chunks, level=6):
+    """Сжимает поток строк в gzip по мере чтения. Маленькие куски
+    копятся внутри компрессора, наружу уходят только готовые блоки."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(author, fmt='jsonl', compress=True, chunk_size=2000):
+    """Итератор байтов выгрузки в формате `fmt` из FORMATS."""
+    encode = encode_csv if fmt == 'csv' else encode_jsonl
+    chunks = encode(records(author, chunk_size))
+    if compress:
+        return gzip_stream(chunks)
+    return (chunk.encode() for chunk in chunks)
+
+
+def filename(author, fmt, compress=True):
+    return f'{author.username}-export.{fmt}' + ('.gz' if compress else '')
@@ -0,0 +1,60 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from yatube.routers import note_writes, use_replicas_fresh_for
+
+KEY_PREFIX = 'feed-generation'
+WRITTEN_PREFIX = 'feed-written'
+
+
+def _key(scope):
+    return f'{KEY_PREFIX}:{scope}'
+
+
+def _written_keys(scopes):
+    return [f'{WRITTEN_PREFIX}:{scope}' for scope in scopes]
+
+
+def _fresh_value():
+    # Потерянный из кеша счётчик начинается с текущего времени,
+    # чтобы не совпасть ни с одним из уже выданных поколений.
+    return int(time.time() * 1000)
+
+
+def get_generation(scope):
+    key = _key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        generation = _fresh_value()
+        if not cache.add(key, generation, timeout=None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def bump_generation(*scopes):
+    """Инвалидирует фрагменты лент для переданных областей."""
+    for scope in scopes:
+        key = _key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_value(), timeout=None)
+    # Новое поколение не должно заполниться с реплики, не видящей запись.
+    keys = _written_keys(scopes)
+    transaction.on_commit(lambda: note_writes(keys))
+
+
+def read_fresh(scopes):
+    """Страница кладёт данные в кеш под текущими поколениями `scopes`:
+    читать их можно только с реплик, видящих все записи в эти области."""
+    use_replicas_fresh_for(_written_keys(scopes))
+
+
+def post_scopes(author_id, *group_ids, post_id=None):
+    scopes = ['index', f'author:{author_id}']
+    if post_id is not None:
+        scopes.append(f'post:{post_id}')
+    scopes.extend(f'group:{group_id}' for group_id in group_ids if group_id)
+    return scopes
@@ -0,0 +1,44 @@
+from django.db import transaction
+
+from . import timeline
+from .models import Follow
+
+
+def followed_authors(user, authors):
+    """Id авторов из `authors` (объекты или id), на которых подписан
+    `user`. Один запрос на любой набор авторов."""
+    if not user.is_authenticated:
+        return set()
+    author_ids = {getattr(author, 'pk', author) for author in authors}
+    author_ids.discard(None)
+    if not author_ids:
+        return set()
+    return set(Follow.objects.filter(
+        user=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+
+
+def mark_followed(user, posts):
+    """Проставляет `post.author_followed` всей странице постов."""
+    posts = list(posts)
+    followed = followed_authors(user, [post.author_id for post in posts])
+    for post in posts:
+        post.author_followed = post.author_id in followed
+
+
+def follow(user, author):
+    """Идемпотентная подписка: повторный или параллельный вызов
+    не создаёт дубликат. Возвращает True, если подписка новая."""
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(user=user, author=author)
+        if created:
+            timeline.backfill(user, author)
+    return created
+
+
+def unfollow(user, author):
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+        if deleted:
+            timeline.remove_author(user, author)
+    return bool(deleted)
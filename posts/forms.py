@@ -1,4 +1,6 @@
 from django import forms
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
 
 from .models import Post, Comment
 
@@ -8,6 +10,19 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, rejected_uploads=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rejected_uploads = rejected_uploads
+
+    def clean_image(self):
+        if 'image' in self.rejected_uploads:
+            raise forms.ValidationError(
+                'Файл слишком большой: не больше '
+                + filesizeformat(settings.POST_IMAGE_MAX_SIZE)
+            )
+        return self.cleaned_data['image']
+
+
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+
+from yatube.routers import PRIMARY
+
+from .feed_cache import bump_generation, get_generation
+from .models import Group
+
+# Поколение в общем кеше: его сдвиг сбрасывает кеш групп во всех процессах
+GENERATION_SCOPE = 'groups'
+
+_groups = {}
+_lock = threading.Lock()
+
+
+def get_group(slug):
+    """Group по slug из кеша процесса или None, если группы нет.
+
+    Запись действительна, пока не сдвинулось поколение групп в общем
+    кеше (одно чтение из кеша вместо запроса к базе) и не истёк
+    GROUP_CACHE_TTL. Отсутствующие slug не кешируются, чтобы кеш не рос
+    от мусорных URL.
+    """
+    now = time.monotonic()
+    generation = get_generation(GENERATION_SCOPE)
+    entry = _groups.get(slug)
+    if entry is not None and entry[1] > now and entry[2] == generation:
+        return entry[0]
+    # Только с основной базы: отставшая реплика отдала бы старую группу
+    # под уже новым поколением.
+    group = Group.objects.using(PRIMARY).filter(slug=slug).first()
+    if group is not None:
+        with _lock:
+            _groups[slug] = (group, now + settings.GROUP_CACHE_TTL,
+                             generation)
+    return group
+
+
+def get_group_or_404(slug):
+    group = get_group(slug)
+    if group is None:
+        raise Http404(f'Нет группы {slug}')
+    return group
+
+
+def clear():
+    """Сбрасывает кеш групп: в этом процессе сразу, в остальных — сдвигом
+    поколения после коммита, чтобы они не перечитали старую строку."""
+    with _lock:
+        _groups.clear()
+    transaction.on_commit(lambda: bump_generation(GENERATION_SCOPE))
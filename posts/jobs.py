@@ -0,0 +1,183 @@
+"""Очередь отложенных задач в базе.
+
+Задача — импортируемая функция и её JSON-аргументы. Строка задачи
+пишется в той же транзакции, что и данные, которые её породили, так что
+задача не теряется и не запускается для откатившейся записи. Воркеры
+(`manage.py run_jobs`) забирают задачи условным UPDATE, поэтому их можно
+запускать сколько угодно: потоками одного процесса или процессами.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Least
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def task_name(func):
+    if isinstance(func, str):
+        return func
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, *args, key=None, priority=0, delay=0, max_attempts=None,
+            **kwargs):
+    """Ставит вызов `func(*args, **kwargs)` в очередь.
+
+    Задачи с большим `priority` выполняются раньше. Пока в очереди есть
+    задача с тем же `key` (включая выполненные за JOB_RETENTION), новая
+    не создаётся и возвращается существующая. С JOBS_EAGER функция
+    вызывается сразу и возвращается None.
+    """
+    name = task_name(func)
+    if settings.JOBS_EAGER:
+        import_string(name)(*args, **kwargs)
+        return None
+    fields = {
+        'task': name,
+        'payload': json.dumps({'args': args, 'kwargs': kwargs}),
+        'priority': priority,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+        'max_attempts': max_attempts or settings.JOB_MAX_ATTEMPTS,
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(key=key, **fields)
+    except IntegrityError:
+        return Job.objects.get(key=key)
+
+
+def enqueue_once(func, priority=0, delay=0):
+    """Ставит задачу без аргументов, если такая же ещё не ждёт в очереди.
+
+    Для задач, которые сами забирают всю накопившуюся работу: ждущую
+    задачу только подтягивают к сроку `delay`. Ключ здесь не подходит —
+    он не даёт поставить задачу снова и после её выполнения.
+    """
+    name = task_name(func)
+    if settings.JOBS_EAGER:
+        import_string(name)()
+        return None
+    run_at = timezone.now() + timedelta(seconds=delay)
+    # Одним UPDATE: задача, которую воркер уже забрал, не считается.
+    waiting = Job.objects.filter(task=name, status=Job.QUEUED).update(
+        run_at=Least('run_at', Value(run_at, output_field=DateTimeField()))
+    )
+    if not waiting:
+        enqueue(func, priority=priority, delay=delay)
+
+
+def retry_delay(attempts):
+    """Пауза перед повтором: удваивается с каждой попыткой до потолка."""
+    return min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+               settings.JOB_RETRY_MAX_DELAY)
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи воркеров, умерших посреди работы."""
+    deadline = timezone.now() - timedelta(seconds=settings.JOB_LEASE)
+    return Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=deadline
+    ).update(status=Job.QUEUED, locked_by='')
+
+
+def purge_finished():
+    deadline = timezone.now() - timedelta(seconds=settings.JOB_RETENTION)
+    deleted, _ = Job.objects.filter(
+        status=Job.DONE, finished__lt=deadline
+    ).delete()
+    return deleted
+
+
+def run_pending(name=None):
+    """Выполняет в текущем потоке все готовые задачи и возвращает их
+    число: тесты и разовые прогоны без запущенного воркера."""
+    worker = Worker(name)
+    done = 0
+    while worker.run_one():
+        done += 1
+    return done
+
+
+class Worker:
+    def __init__(self, name=None):
+        self.name = name or (
+            f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+        )
+
+    def claim(self):
+        """Забирает самую приоритетную готовую задачу. UPDATE с условием
+        на статус атомарен, так что задачу получит ровно один воркер."""
+        now = timezone.now()
+        candidates = Job.objects.filter(
+            status=Job.QUEUED, run_at__lte=now
+        ).order_by('-priority', 'run_at', 'id').values_list('id', flat=True)
+        for job_id in candidates[:settings.JOB_CLAIM_BATCH]:
+            claimed = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+                status=Job.RUNNING, locked_by=self.name, locked_at=now,
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return Job.objects.get(id=job_id)
+        return None
+
+    def run_one(self):
+        """Выполняет одну задачу; False, если выполнять нечего."""
+        job = self.claim()
+        if job is None:
+            return False
+        try:
+            data = json.loads(job.payload)
+            import_string(job.task)(*data['args'], **data['kwargs'])
+        except Exception:
+            self.fail(job, traceback.format_exc())
+        else:
+            Job.objects.filter(id=job.id).update(
+                status=Job.DONE, finished=timezone.now(), last_error='',
+            )
+        return True
+
+    def fail(self, job, error):
+        logger.warning('Задача %s (%s) упала, попытка %s из %s', job.id,
+                       job.task, job.attempts, job.max_attempts)
+        changes = {'last_error': error, 'locked_by': ''}
+        if job.attempts >= job.max_attempts:
+            changes.update(status=Job.FAILED, finished=timezone.now())
+        else:
+            changes.update(
+                status=Job.QUEUED,
+                run_at=timezone.now() + timedelta(
+                    seconds=retry_delay(job.attempts)
+                ),
+            )
+        Job.objects.filter(id=job.id).update(**changes)
+
+    def run(self, stop, once=False, poll=1.0):
+        """Цикл воркера до `stop.set()`; с `once` — пока очередь не опустеет.
+        Возвращает число выполненных задач."""
+        done = 0
+        while not stop.is_set():
+            close_old_connections()
+            if self.run_one():
+                done += 1
+            elif once:
+                break
+            else:
+                # Пока очередь пуста, подбираем задачи упавших воркеров.
+                requeue_stale()
+                stop.wait(poll)
+        return done
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bulk_import import IMPORTERS
+
+
+class ImportCommand(BaseCommand):
+    """Общая часть команд import_posts, import_comments, import_follows."""
+    kind = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL, одна запись в строке')
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько строк вставлять одной транзакцией',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, забыв контрольную точку',
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Заводить незнакомых пользователей без пароля',
+        )
+
+    def progress(self, importer, seconds):
+        rate = importer.inserted / seconds if seconds else 0
+        self.stdout.write(
+            f'строка {importer.line}: добавлено {importer.inserted}, '
+            f'пропущено {importer.skipped}, {rate:.0f} записей/с'
+        )
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[self.kind](
+            options['chunk_size'], options['create_users']
+        )
+        try:
+            inserted = importer.run(
+                options['path'], options['restart'], self.progress
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(
+                f'{error}; импорт продолжится со строки '
+                f'{importer.line + 1} повторным запуском'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершён: добавлено {inserted}, '
+            f'пропущено {importer.skipped}'
+        ))
@@ -0,0 +1,96 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+
+from yatube import benchmark
+
+BASELINE = os.path.join(settings.BASE_DIR, 'yatube', 'benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все страницы на тестовой базе с заданным набором '
+            'данных и сравнивает задержки и число запросов с базовой линией')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=BASELINE)
+        parser.add_argument(
+            '--write-baseline', action='store_true',
+            help='Сохранить результаты как новую базовую линию',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='Допустимый относительный рост p95',
+        )
+        parser.add_argument(
+            '--no-latency', action='store_true',
+            help='Сравнивать только число запросов',
+        )
+        for key, value in benchmark.DEFAULT_DATASET.items():
+            parser.add_argument(
+                '--' + key.replace('_', '-'), type=type(value), default=None,
+                help=f'Размер набора данных (по умолчанию из базовой линии '
+                     f'или {value})',
+            )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if os.path.exists(options['baseline']):
+            baseline = benchmark.load_baseline(options['baseline'])
+        dataset = dict(benchmark.DEFAULT_DATASET)
+        if baseline is not None:
+            dataset.update(baseline['dataset'])
+        for key in dataset:
+            if options[key] is not None:
+                dataset[key] = options[key]
+
+        setup_test_environment(debug=False)
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            with benchmark.isolated():
+                fixtures = benchmark.seed(dataset)
+                results = benchmark.run(
+                    fixtures, options['repeat'], options['warmup']
+                )
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'view':<20}{'queries':>8}{'p50 ms':>10}"
+                          f"{'p95 ms':>10}{'sql ms':>10}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<20}{result['queries']:>8}{result['p50_ms']:>10}"
+                f"{result['p95_ms']:>10}{result['sql_ms']:>10}"
+            )
+
+        if options['write_baseline']:
+            benchmark.save_baseline(options['baseline'], dataset, results)
+            self.stdout.write(self.style.SUCCESS(
+                f"Базовая линия записана: {options['baseline']}"
+            ))
+            return
+        if baseline is None:
+            raise CommandError(
+                'Нет базовой линии, запустите с --write-baseline'
+            )
+        if dataset != baseline['dataset']:
+            raise CommandError(
+                'Набор данных отличается от базовой линии, сравнение '
+                'не имеет смысла'
+            )
+        problems = benchmark.compare(
+            results, baseline['views'], options['tolerance'],
+            latency=not options['no_latency'],
+        )
+        if problems:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(problems)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты и комментарии пользователя в JSONL или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--format', choices=export.FORMATS,
+                            default='jsonl')
+        parser.add_argument(
+            '--output',
+            help='Файл выгрузки; без него строки пишутся в stdout',
+        )
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжимать выгрузку (только с --output)')
+        parser.add_argument('--chunk-size', type=int,
+                            default=settings.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        author = User.objects.filter(username=options['username']).first()
+        if author is None:
+            raise CommandError(f"Нет пользователя {options['username']}")
+        if options['gzip'] and not options['output']:
+            raise CommandError('--gzip пишет двоичный файл, укажите --output')
+        chunks = export.export(author, options['format'], options['gzip'],
+                               options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+        size = 0
+        with open(options['output'], 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+                size += len(chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f"Выгрузка записана: {options['output']}, {size} байт"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры POST_THUMBNAILS для уже загруженных картинок'
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).order_by().values_list('image', flat=True).distinct()
+        total = thumbnails.backfill(names.iterator())
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры построены, файлов: {total}'
+        ))
@@ -0,0 +1,6 @@
+from ._import import ImportCommand
+
+
+class Command(ImportCommand):
+    help = 'Импортирует комментарии из JSONL пачками bulk_create'
+    kind = 'comments'
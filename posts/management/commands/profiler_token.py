@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from yatube.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = ('Выдаёт подписанный токен для заголовка X-Profile, '
+            'включающего профайлер на отдельный запрос')
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
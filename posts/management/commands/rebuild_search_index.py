@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('Полнотекстовый поиск работает только на SQLite')
+        total = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс перестроен, постов: {total}'
+        ))
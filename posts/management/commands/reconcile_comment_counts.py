@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_comment_counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики комментариев постов'
+
+    def handle(self, *args, **options):
+        updated = reconcile_comment_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики комментариев пересчитаны, постов: {updated}'
+        ))
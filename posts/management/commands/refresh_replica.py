@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube.db import copy_database
+from yatube.routers import mark_synced
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик из '
+            'DATABASE_REPLICAS (для локальной проверки маршрутизации)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=float, default=0,
+            help='Повторять каждые N секунд, пока не прервут',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены (YATUBE_DB_REPLICA)')
+        primary = settings.DATABASES['default']
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Копирование реплик есть только для SQLite')
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                # Копия содержит всё, что закоммичено до начала копирования.
+                started = time.time()
+                copy_database(primary['NAME'],
+                              settings.DATABASES[alias]['NAME'])
+                mark_synced(alias, started)
+            self.stdout.write(self.style.SUCCESS(
+                f'Реплики обновлены: {", ".join(settings.DATABASE_REPLICAS)}'
+            ))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
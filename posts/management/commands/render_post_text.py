@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Post
+from posts.rendering import rerender
+
+
+class Command(BaseCommand):
+    help = 'Заново строит text_html и excerpt постов и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько записей обновлять одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = rerender(Post.objects.all(), batch_size)
+        comments = rerender(Comment.objects.all(), batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Текст перестроен: постов {posts}, комментариев {comments}'
+        ))
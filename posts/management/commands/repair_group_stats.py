@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import repair_group_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает число постов, активность и превью групп'
+
+    def handle(self, *args, **options):
+        updated = repair_group_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Статистика пересчитана, групп: {updated}'
+        ))
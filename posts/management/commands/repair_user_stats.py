@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import repair_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики подписчиков, подписок, постов и комментариев'
+
+    def handle(self, *args, **options):
+        updated = repair_user_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Статистика пересчитана, пользователей: {updated}'
+        ))
@@ -0,0 +1,52 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts import jobs
+
+
+class Command(BaseCommand):
+    help = ('Выполняет задачи из очереди (posts.jobs). Для нескольких '
+            'процессов запустите команду несколько раз')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int,
+                            default=settings.JOB_WORKERS)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти',
+        )
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Пауза при пустой очереди, секунд')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        results = []
+
+        def work(own_connection):
+            try:
+                results.append(
+                    jobs.Worker().run(stop, options['once'], options['poll'])
+                )
+            finally:
+                if own_connection:
+                    connection.close()
+
+        jobs.requeue_stale()
+        jobs.purge_finished()
+        threads = [threading.Thread(target=work, args=(True,))
+                   for _ in range(options['threads'] - 1)]
+        for thread in threads:
+            thread.start()
+        try:
+            # Один из воркеров работает в основном потоке.
+            work(False)
+        except KeyboardInterrupt:
+            stop.set()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {sum(results)}'
+        ))
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    depth = settings.TIMELINE_DEPTH
+    for follow in Follow.objects.order_by('id').iterator():
+        posts = Post.objects.filter(author_id=follow.author_id).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', 'pub_date')[:depth]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=follow.user_id, post_id=post_id,
+                           pub_date=pub_date)
+             for post_id, pub_date in posts],
+            ignore_conflicts=True,
+        )
+    overfull = TimelineEntry.objects.order_by().values('user_id').annotate(
+        total=Count('id')
+    ).filter(total__gt=depth).values_list('user_id', flat=True)
+    for user_id in overfull:
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        pub_date, post_id = entries.order_by(
+            '-pub_date', '-post_id'
+        ).values_list('pub_date', 'post_id')[depth - 1]
+        entries.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, post_id__lt=post_id)
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_auto_20210117_1855'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='posts_timeline_user_date'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentry',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
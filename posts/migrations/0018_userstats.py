@@ -0,0 +1,56 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:14
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_user_stats(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserStats = apps.get_model('posts', 'UserStats')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+
+    def count(model, field):
+        counts = model.objects.filter(**{field: OuterRef('pk')}).order_by(
+        ).values(field).annotate(total=Count('pk')).values('total')
+        return Coalesce(
+            Subquery(counts, output_field=models.IntegerField()), 0
+        )
+
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id)
+         for user_id in User.objects.values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    UserStats.objects.update(
+        followers=count(Follow, 'author'),
+        following=count(Follow, 'user'),
+        posts=count(Post, 'author'),
+        comments=count(Comment, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0017_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers', models.PositiveIntegerField(default=0)),
+                ('following', models.PositiveIntegerField(default=0)),
+                ('posts', models.PositiveIntegerField(default=0)),
+                ('comments', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+from posts.rendering import rerender
+
+
+def fill_rendered_text(apps, schema_editor):
+    for name in ('Post', 'Comment'):
+        rerender(apps.get_model('posts', name).objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_comment_post_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_rendered_text, migrations.RunPython.noop),
+    ]
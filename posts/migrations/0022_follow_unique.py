@@ -0,0 +1,43 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:28
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def follow_count(Follow, field):
+    counts = Follow.objects.filter(**{field: OuterRef('user')}).order_by(
+    ).values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    keep = Follow.objects.values('user', 'author').annotate(
+        first=Min('id')
+    ).values('first')
+    removed, _ = Follow.objects.exclude(id__in=Subquery(keep)).delete()
+    if removed:
+        UserStats.objects.update(
+            followers=follow_count(Follow, 'author'),
+            following=follow_count(Follow, 'user'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0021_rendered_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='follow',
+            unique_together={('user', 'author')},
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.6 on 2026-10-18 20:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    Post = apps.get_model('posts', 'Post')
+    GroupStats.objects.bulk_create(
+        [GroupStats(group_id=group_id)
+         for group_id in Group.objects.values_list('id', flat=True)]
+    )
+    counts = Post.objects.filter(group=OuterRef('pk')).order_by().values(
+        'group'
+    ).annotate(total=Count('pk')).values('total')
+    latest = Post.objects.filter(group=OuterRef('pk')).order_by(
+        '-pub_date', '-id'
+    )
+    GroupStats.objects.update(
+        posts=Coalesce(
+            Subquery(counts, output_field=models.IntegerField()), 0
+        ),
+        latest_post=Subquery(latest.values('id')[:1]),
+        last_activity=Subquery(latest.values('pub_date')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('posts', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+                ('latest_post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='posts.Post')),
+            ],
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
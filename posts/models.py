@@ -1,8 +1,53 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
+from .rendering import EXCERPT_LENGTH, fill_rendered
+
 User = get_user_model()
 
+RENDERED_FIELDS = ('text_html', 'excerpt')
+
+
+class RenderedTextManager(models.Manager):
+    """bulk_create и bulk_update минуют save(), поэтому HTML текста
+    для них строится здесь. Запросы остаются обычными QuerySet."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            fill_rendered(obj)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'text' in fields:
+            objs = list(objs)
+            for obj in objs:
+                fill_rendered(obj)
+            fields = [*fields, *(
+                name for name in RENDERED_FIELDS if name not in fields
+            )]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
+class RenderedTextModel(models.Model):
+    """HTML текста (text_html) и excerpt строятся один раз при записи,
+    а не на каждом показе ленты."""
+    objects = RenderedTextManager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if 'text' in self.__dict__ and (
+            update_fields is None or 'text' in update_fields
+        ):
+            fill_rendered(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+        super().save(*args, **kwargs)
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -17,7 +62,7 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class Post(RenderedTextModel):
     text = models.TextField(
         max_length=2000,
         verbose_name='текст',
@@ -45,6 +90,21 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True, null=True
     )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+    text_html = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+    )
+    excerpt = models.CharField(
+        max_length=EXCERPT_LENGTH,
+        blank=True,
+        default='',
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-pub_date']
@@ -53,7 +113,7 @@ class Post(models.Model):
         return self.text
 
 
-class Comment(models.Model):
+class Comment(RenderedTextModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -73,6 +133,25 @@ class Comment(models.Model):
         "date published",
         auto_now_add=True
     )
+    text_html = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+    )
+    excerpt = models.CharField(
+        max_length=EXCERPT_LENGTH,
+        blank=True,
+        default='',
+        editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='posts_comment_post_created',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -87,3 +166,109 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+
+    class Meta:
+        unique_together = ('user', 'author')
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='posts_timeline_user_date',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    followers = models.PositiveIntegerField(default=0)
+    following = models.PositiveIntegerField(default=0)
+    posts = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+
+
+class GroupStats(models.Model):
+    """Сводка для каталога групп, обновляется сигналами при изменении постов."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(null=True, blank=True)
+    latest_post = models.ForeignKey(
+        Post,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+
+
+class ImportCheckpoint(models.Model):
+    """Сколько строк файла уже импортировано (manage.py import_*)."""
+    source = models.CharField(max_length=255, unique=True)
+    line = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+
+class Job(models.Model):
+    """Отложенный вызов функции для воркера `manage.py run_jobs`."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'в очереди'),
+        (RUNNING, 'выполняется'),
+        (DONE, 'выполнена'),
+        (FAILED, 'не удалась'),
+    ]
+
+    task = models.CharField(max_length=200)
+    payload = models.TextField(default='{}')
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    key = models.CharField(max_length=200, unique=True, null=True,
+                           blank=True)
+    last_error = models.TextField(blank=True, default='')
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at'],
+                name='posts_job_pick',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} [{self.status}]'
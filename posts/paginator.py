@@ -0,0 +1,131 @@
+import base64
+import json
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Границы INTEGER в SQLite: большие числа из токена дали бы OverflowError
+SQL_INT_MIN, SQL_INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def encode_token(data):
+    """Непрозрачный URL-безопасный токен курсора."""
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Словарь из токена курсора или {} для испорченного токена."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError, AttributeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def is_sql_int(value):
+    """Целое, которое можно передать в запрос (bool не считается)."""
+    return type(value) is int and SQL_INT_MIN <= value <= SQL_INT_MAX
+
+
+def cursor_page(rows, paginator, next_cursor=None, previous_cursor=None):
+    """Обычный `Page` с курсорами для компонента паджинатора."""
+    page = Page(rows, 1, paginator)
+    page.cursor_mode = True
+    page.next_cursor = next_cursor
+    page.previous_cursor = previous_cursor
+    return page
+
+
+class CursorPaginator:
+    """Keyset-пагинатор по паре (поле даты, id), по умолчанию (pub_date, id).
+    Вместо id можно взять другой уникальный столбец (`tiebreaker`).
+
+    Вместо OFFSET и COUNT(*) делает один запрос «после/до опорной записи»,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Возвращает обычный `Page`, к которому добавлены `next_cursor`
+    и `previous_cursor` (непрозрачные токены для `?cursor=`).
+    """
+
+    def __init__(self, object_list, per_page, paginator=None,
+                 field='pub_date', descending=True, tiebreaker='id'):
+        self.field = field
+        self.descending = descending
+        self.tiebreaker = tiebreaker
+        sign = '-' if descending else ''
+        self.object_list = object_list.order_by(sign + field,
+                                                sign + tiebreaker)
+        self.per_page = per_page
+        self.paginator = paginator or Paginator(self.object_list, per_page)
+
+    def encode_cursor(self, obj, backwards=False):
+        return encode_token({
+            'd': getattr(obj, self.field).isoformat(),
+            'i': getattr(obj, self.tiebreaker),
+            'b': int(backwards),
+        })
+
+    @staticmethod
+    def decode_cursor(cursor):
+        data = decode_token(cursor)
+        try:
+            value = parse_datetime(data['d'])
+            if value is None or not is_sql_int(data['i']):
+                return None
+            return value, data['i'], bool(data.get('b'))
+        except (ValueError, TypeError, KeyError):
+            return None
+
+    def _seek(self, value, pk, forward):
+        """Записи строго после опорной в заданном направлении обхода."""
+        lookup = 'lt' if forward == self.descending else 'gt'
+        queryset = self.object_list.filter(
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'{self.tiebreaker}__{lookup}': pk})
+        )
+        if not forward:
+            queryset = queryset.reverse()
+        return list(queryset[:self.per_page + 1])
+
+    def get_page(self, cursor=None):
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            rows = list(self.object_list[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = False
+        else:
+            value, pk, backwards = position
+            rows = self._seek(value, pk, forward=not backwards)
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            if backwards:
+                rows.reverse()
+                has_next, has_previous = True, has_more
+            else:
+                has_next, has_previous = has_more, True
+        return self._build_page(rows, has_next, has_previous)
+
+    def _build_page(self, rows, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0], backwards=True)
+        return cursor_page(rows, self.paginator, next_cursor, previous_cursor)
+
+
+def paginate(request, object_list, per_page, tiebreaker='id'):
+    """Возвращает (paginator, page) для ленты постов.
+
+    Старые ссылки вида `?page=N` обслуживаются обычным `Paginator`,
+    всё остальное — курсорной пагинацией без подсчёта записей.
+    """
+    paginator = Paginator(object_list, per_page)
+    if 'page' in request.GET:
+        return paginator, paginator.get_page(request.GET.get('page'))
+    cursor_paginator = CursorPaginator(object_list, per_page, paginator,
+                                       tiebreaker=tiebreaker)
+    return paginator, cursor_paginator.get_page(request.GET.get('cursor'))
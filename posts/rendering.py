@@ -0,0 +1,42 @@
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+EXCERPT_LENGTH = 200
+
+
+def render_text(text):
+    """HTML текста: то же, что `{{ text|linebreaksbr }}` в шаблоне."""
+    return str(linebreaksbr(text, autoescape=True))
+
+
+def make_excerpt(text):
+    """Короткий текст без переносов строк для превью и description."""
+    return Truncator(' '.join(text.split())).chars(EXCERPT_LENGTH)
+
+
+def fill_rendered(instance):
+    instance.text_html = render_text(instance.text)
+    instance.excerpt = make_excerpt(instance.text)
+
+
+def rerender(queryset, batch_size=500):
+    """Перестраивает text_html и excerpt пачками bulk_update.
+    Возвращает число обновлённых записей."""
+    total = 0
+    batch = []
+    for instance in queryset.only('id', 'text').order_by('pk').iterator(
+        chunk_size=batch_size
+    ):
+        fill_rendered(instance)
+        batch.append(instance)
+        if len(batch) >= batch_size:
+            total += _flush(queryset.model, batch)
+    return total + _flush(queryset.model, batch)
+
+
+def _flush(model, batch):
+    count = len(batch)
+    if batch:
+        model.objects.bulk_update(batch, ['text_html', 'excerpt'])
+        batch.clear()
+    return count
@@ -0,0 +1,190 @@
+import math
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Group, Post, User
+from .paginator import cursor_page, decode_token, encode_token, is_sql_int
+
+FTS_TABLE = 'posts_post_fts'
+
+# Маркеры подсветки: в пользовательском тексте их не бывает, поэтому
+# сниппет можно сначала экранировать, а потом превратить их в <mark>.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+# Веса bm25 для колонок text, group_title, author.
+RANK = f'bm25({FTS_TABLE}, 1.0, 0.5, 0.5)'
+
+# Управляющие символы: NUL обрывает строку запроса FTS5, остальные
+# (включая маркеры подсветки) в поиске не нужны.
+CONTROL_CHARS = re.compile('[\x00-\x1f\x7f-\x9f]')
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def fts_query(query):
+    """Превращает пользовательский ввод в безопасный запрос FTS5.
+
+    Каждое слово берётся в кавычки (никакого синтаксиса FTS5 из ввода),
+    последнее ищется по префиксу, чтобы поиск работал по мере набора.
+    """
+    query = CONTROL_CHARS.sub(' ', query)
+    terms = [term.replace('"', '""') for term in query.split()]
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _insert_sql():
+    return (
+        f'INSERT INTO {FTS_TABLE} (rowid, text, group_title, author) '
+        "SELECT p.id, p.text, COALESCE(g.title, ''), u.username "
+        f'FROM {Post._meta.db_table} p '
+        f'JOIN {User._meta.db_table} u ON u.id = p.author_id '
+        f'LEFT JOIN {Group._meta.db_table} g ON g.id = p.group_id'
+    )
+
+
+def index_post(post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+        cursor.execute(_insert_sql() + ' WHERE p.id = %s', [post_id])
+
+
+def index_posts(post_ids):
+    """Индексирует пачку постов двумя запросами вместо двух на пост."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            post_ids,
+        )
+        cursor.execute(
+            _insert_sql() + f' WHERE p.id IN ({placeholders})', post_ids
+        )
+
+
+def remove_post(post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def reindex_group(group):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {FTS_TABLE} SET group_title = %s WHERE rowid IN '
+            f'(SELECT id FROM {Post._meta.db_table} WHERE group_id = %s)',
+            [group.title, group.id],
+        )
+
+
+def reindex_author(user):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {FTS_TABLE} SET author = %s WHERE rowid IN '
+            f'(SELECT id FROM {Post._meta.db_table} WHERE author_id = %s)',
+            [user.username, user.id],
+        )
+
+
+def rebuild():
+    """Перестраивает индекс целиком одним INSERT ... SELECT."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(_insert_sql())
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES (\'optimize\')'
+        )
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def decode_position(cursor):
+    """Опорная пара (rank, rowid) из курсора или {} для первой страницы:
+    испорченный курсор не должен доходить до SQL."""
+    position = decode_token(cursor) if cursor else {}
+    if 'r' not in position and 'i' not in position:
+        return position
+    rank = position.get('r')
+    if (type(rank) not in (int, float) or not math.isfinite(rank)
+            or not is_sql_int(position.get('i'))):
+        return {}
+    return position
+
+
+def search(query, cursor=None, per_page=10):
+    """Страница результатов, упорядоченных по релевантности (bm25).
+
+    Пагинация курсорная по паре (rank, rowid), как и в лентах.
+    У каждого поста есть `snippet` с подсвеченными совпадениями.
+    """
+    match = fts_query(query)
+    if not match:
+        return cursor_page([], None)
+    position = decode_position(cursor)
+    backwards = bool(position.get('b'))
+    sql = (
+        f'SELECT rowid, {RANK} AS score, '
+        f"snippet({FTS_TABLE}, 0, %s, %s, '…', 16) "
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+    )
+    params = [MARK_START, MARK_END, match]
+    if 'r' in position and 'i' in position:
+        op = '<' if backwards else '>'
+        sql += (
+            f' AND ({RANK} {op} %s OR ({RANK} = %s AND rowid {op} %s))'
+        )
+        params += [position['r'], position['r'], position['i']]
+    order = 'DESC' if backwards else 'ASC'
+    sql += f' ORDER BY score {order}, rowid {order} LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, 'r' in position
+
+    posts = Post.objects.select_related('author', 'group').defer(
+        'text'
+    ).in_bulk([row[0] for row in rows])
+    results = []
+    for post_id, score, snippet in rows:
+        post = posts.get(post_id)
+        if post is None:
+            continue
+        post.snippet = highlight(snippet)
+        post.score = score
+        results.append(post)
+
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_token({'r': rows[-1][1], 'i': rows[-1][0]})
+    if rows and has_previous:
+        previous_cursor = encode_token(
+            {'r': rows[0][1], 'i': rows[0][0], 'b': 1}
+        )
+    return cursor_page(results, None, next_cursor, previous_cursor)
@@ -0,0 +1,139 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import group_cache, search, thumbnails, timeline
+from .counters import bump_group_stats, bump_user_stats, refresh_latest_post
+from .feed_cache import bump_generation, post_scopes
+from .models import Comment, Follow, Group, GroupStats, Post, User
+
+
+def bump_post_generations(post_id):
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        bump_generation(*post_scopes(
+            post['author_id'], post['group_id'], post_id=post_id
+        ))
+
+
+def image_name(instance):
+    image = instance.__dict__.get('image')
+    return getattr(image, 'name', image) or None
+
+
+@receiver(post_init, sender=Post)
+def remember_original(sender, instance, **kwargs):
+    instance._original_group_id = instance.__dict__.get('group_id')
+    instance._original_image = image_name(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        # Сразу, а не в очереди: ленты подписчиков не должны ждать
+        # воркера, а рассылка — один INSERT на всех подписчиков.
+        timeline.fan_out(instance)
+        bump_user_stats(instance.author_id, posts=1)
+        bump_group_stats(instance.group_id, posts=1, latest=instance)
+    elif instance.group_id != instance._original_group_id:
+        bump_group_stats(instance._original_group_id, posts=-1, touch=False)
+        refresh_latest_post(instance._original_group_id, instance.id)
+        bump_group_stats(instance.group_id, posts=1, latest=instance)
+    else:
+        bump_group_stats(instance.group_id)
+    bump_generation(*post_scopes(
+        instance.author_id, instance.group_id, instance._original_group_id,
+        post_id=instance.id,
+    ))
+    instance._original_group_id = instance.group_id
+    image = image_name(instance)
+    if image and image != instance._original_image:
+        thumbnails.schedule(image)
+    instance._original_image = image
+    if search.enabled():
+        search.index_post(instance.id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_user_stats(instance.author_id, posts=-1)
+    bump_group_stats(instance.group_id, posts=-1, touch=False)
+    refresh_latest_post(instance.group_id, instance.id)
+    bump_generation(*post_scopes(
+        instance.author_id, instance.group_id, instance._original_group_id,
+        post_id=instance.id,
+    ))
+    if search.enabled():
+        search.remove_post(instance.id)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1
+        )
+        bump_user_stats(instance.author_id, comments=1)
+        bump_post_generations(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1
+    )
+    bump_user_stats(instance.author_id, comments=-1)
+    bump_post_generations(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_user_stats(instance.author_id, followers=1)
+        bump_user_stats(instance.user_id, following=1)
+        bump_generation(f'follow:{instance.user_id}',
+                        f'followers:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump_user_stats(instance.author_id, followers=-1)
+    bump_user_stats(instance.user_id, following=-1)
+    bump_generation(f'follow:{instance.user_id}',
+                    f'followers:{instance.author_id}')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    group_cache.clear()
+    if raw:
+        return
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+        return
+    bump_generation(f'group:{instance.id}')
+    if search.enabled():
+        search.reindex_group(instance)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    group_cache.clear()
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._original_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    if instance.username != instance._original_username and search.enabled():
+        search.reindex_author(instance)
+    instance._original_username = instance.username
@@ -0,0 +1,30 @@
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}(\.\w+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы с именем-хешем содержимого не дублируются: повторная
+    загрузка той же картинки возвращает уже лежащий файл."""
+
+    def is_content_addressed(self, name):
+        return bool(CONTENT_ADDRESSED_NAME.match(os.path.basename(name)))
+
+    def get_available_name(self, name, max_length=None):
+        if self.is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not self.is_content_addressed(name):
+            return super()._save(name, content)
+        if self.exists(name):
+            return name
+        # Пишем во временный файл и атомарно переименовываем: при гонке
+        # двух одинаковых загрузок останется один файл с тем же содержимым.
+        partial = super()._save(name + '.part', content)
+        os.replace(self.path(partial), self.path(name))
+        return name
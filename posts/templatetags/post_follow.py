@@ -0,0 +1,21 @@
+from django import template
+
+from posts.follows import mark_followed
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_follow_state(context, page, following=None):
+    """Проставляет `post.author_followed` странице постов. Если
+    представление уже знает ответ (страница одного автора в профиле),
+    он передаётся в `following`, и запроса нет."""
+    user = context.get('user')
+    if user is None or not user.is_authenticated:
+        return ''
+    if following is None:
+        mark_followed(user, page)
+        return ''
+    for post in page:
+        post.author_followed = following
+    return ''
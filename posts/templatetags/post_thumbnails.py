@@ -0,0 +1,18 @@
+from django import template
+
+from posts.thumbnails import prefetch_thumbnails, ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, derivative='card'):
+    if hasattr(post, 'thumb'):
+        return post.thumb
+    return ready_thumbnail(post.image, derivative)
+
+
+@register.simple_tag
+def prefetch_page_thumbnails(page, derivative='card'):
+    prefetch_thumbnails(page, derivative)
+    return ''
@@ -0,0 +1,68 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='TestAuthor')
+        cls.reader = User.objects.create(username='TestReader')
+        cls.group = Group.objects.create(title='group', slug='group')
+        cls.post = Post.objects.create(text='post', author=cls.author,
+                                       group=cls.group)
+        cls.urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': 'group'}),
+            reverse('profile', kwargs={'username': 'TestAuthor'}),
+            reverse('post', kwargs={'username': 'TestAuthor',
+                                    'post_id': cls.post.id}),
+        ]
+
+    def test_unchanged_pages_return_304_without_rendering(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                client = Client()
+                response = client.get(url)
+                with self.assertTemplateNotUsed('base.html'):
+                    revisit = client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(revisit.status_code, 304)
+
+    def test_new_comment_changes_post_etag(self):
+        client = Client()
+        url = self.urls[-1]
+        etag = client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='comment')
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_varies_by_user(self):
+        guest_etag = Client().get(self.urls[0])['ETag']
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(self.urls[0], HTTP_IF_NONE_MATCH=guest_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_changes_profile_etag(self):
+        client = Client()
+        client.force_login(self.reader)
+        url = self.urls[2]
+        etag = client.get(url)['ETag']
+        client.get(reverse('profile_follow',
+                           kwargs={'username': 'TestAuthor'}))
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_following'])
+
+    def test_missing_group_is_not_found(self):
+        response = Client().get(
+            reverse('group_posts', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
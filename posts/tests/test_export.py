@@ -0,0 +1,81 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='leo')
+        cls.other = User.objects.create(username='other')
+        group = Group.objects.create(title='Cats', slug='cats',
+                                     description='cats')
+        cls.post = Post.objects.create(text='первый, "с кавычками"',
+                                       author=cls.author, group=group)
+        Post.objects.create(text='второй\nпост', author=cls.author)
+        Post.objects.create(text='чужой', author=cls.other)
+        Comment.objects.create(post=cls.post, author=cls.author,
+                               text='свой комментарий')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(ExportTests.author)
+        self.url = reverse('export', kwargs={'username': 'leo'})
+
+    def test_gzip_jsonl_stream(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('leo-export.jsonl.gz', response['Content-Disposition'])
+        body = gzip.decompress(b''.join(response.streaming_content))
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['type'] for row in rows],
+                         ['post', 'post', 'comment'])
+        self.assertEqual(rows[0]['group'], 'cats')
+        self.assertEqual(rows[1]['text'], 'второй\nпост')
+        self.assertEqual(rows[2]['post_id'], self.post.id)
+
+    def test_plain_csv(self):
+        response = self.client.get(self.url, {'format': 'csv', 'gzip': '0'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        body = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['text'], 'первый, "с кавычками"')
+
+    def test_only_owner_or_staff(self):
+        self.client.force_login(self.other)
+        response = self.client.get(self.url)
+        self.assertRedirects(
+            response, reverse('profile', kwargs={'username': 'leo'})
+        )
+        self.other.is_staff = True
+        self.other.save()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_user', 'leo', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+        handle, path = tempfile.mkstemp(suffix='.csv.gz')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('export_user', 'leo', '--format', 'csv', '--gzip',
+                     '--output', path, stdout=StringIO())
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            self.assertEqual(len(list(csv.reader(file))), 4)
@@ -1,9 +1,10 @@
+import hashlib
 import shutil
 import tempfile
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -15,7 +16,9 @@ class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
         cls.user = User.objects.create(username='TestUser')
         cls.group = Group.objects.create(
             title='testGroup',
@@ -30,25 +33,27 @@ class PostCreateFormTests(TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
         super().tearDownClass()
 
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(PostCreateFormTests.user)
 
+    image = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+        )
+
     def test_create_new_post(self):
-        image = (
-            b'\x47\x49\x46\x38\x39\x61\x02\x00'
-            b'\x01\x00\x80\x00\x00\x00\x00\x00'
-            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
-            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
-            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
-            b'\x0A\x00\x3B'
-            )
         uploaded = SimpleUploadedFile(
             name='small.gif',
-            content=image,
+            content=self.image,
             content_type='image/gif'
         )
         form_data = {
@@ -63,4 +68,43 @@ class PostCreateFormTests(TestCase):
         )
 
         self.assertEqual(Post.objects.count(), 2)
+        self.assertTrue(Post.objects.filter(text='Test text')
+                        .exclude(image='').exists())
+
+    def test_same_image_stored_once(self):
+        for text in ('first', 'second'):
+            uploaded = SimpleUploadedFile(
+                name=f'{text}.gif',
+                content=self.image,
+                content_type='image/gif'
+            )
+            self.authorized_client.post(
+                reverse('new_post'),
+                data={'text': text, 'image': uploaded}
+            )
+        first = Post.objects.get(text='first')
+        second = Post.objects.get(text='second')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image.name,
+                         f'posts/{hashlib.sha256(self.image).hexdigest()}.gif')
+
+    @override_settings(POST_IMAGE_MAX_SIZE=10)
+    def test_oversized_image_rejected(self):
+        uploaded = SimpleUploadedFile(
+            name='big.gif',
+            content=self.image,
+            content_type='image/gif'
+        )
+        response = self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'too big', 'image': uploaded}
+        )
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertFalse(Post.objects.filter(text='too big').exists())
 
+    def test_hashed_uploads_keep_csrf_check(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(PostCreateFormTests.user)
+        response = client.post(reverse('new_post'), data={'text': 'csrf'})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Post.objects.filter(text='csrf').exists())
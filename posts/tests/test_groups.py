@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import group_cache
+from posts.feed_cache import bump_generation
+from posts.models import Group, GroupStats, Post
+
+User = get_user_model()
+
+
+class GroupDirectoryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='TestUser')
+        cls.cats = Group.objects.create(title='Cats', slug='cats',
+                                        description='cats')
+        cls.dogs = Group.objects.create(title='Dogs', slug='dogs',
+                                        description='dogs')
+
+    def setUp(self):
+        self.client = Client()
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_stats_follow_posts(self):
+        first = Post.objects.create(text='first', author=self.user,
+                                    group=self.cats)
+        second = Post.objects.create(text='second', author=self.user,
+                                     group=self.cats)
+        stats = self.stats(self.cats)
+        self.assertEqual(stats.posts, 2)
+        self.assertEqual(stats.latest_post, second)
+        self.assertIsNotNone(stats.last_activity)
+
+        second.group = self.dogs
+        second.save()
+        self.assertEqual(self.stats(self.cats).posts, 1)
+        self.assertEqual(self.stats(self.cats).latest_post, first)
+        self.assertEqual(self.stats(self.dogs).posts, 1)
+        self.assertEqual(self.stats(self.dogs).latest_post, second)
+
+        first.delete()
+        stats = self.stats(self.cats)
+        self.assertEqual(stats.posts, 0)
+        self.assertIsNone(stats.latest_post)
+
+    def test_directory_lists_active_groups_first(self):
+        Post.objects.create(text='новости собак', author=self.user,
+                            group=self.dogs)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('group_list'))
+        groups = list(response.context['page'])
+        self.assertEqual(groups, [self.dogs, self.cats])
+        self.assertContains(response, 'Записей: 1')
+        self.assertContains(response, 'новости собак')
+
+    def test_slug_lookup_cached_until_group_saved(self):
+        group_cache.clear()
+        group_cache.get_group('cats')
+        with self.assertNumQueries(0):
+            self.assertEqual(group_cache.get_group('cats'), self.cats)
+        self.cats.title = 'Коты'
+        self.cats.save()
+        self.assertEqual(group_cache.get_group('cats').title, 'Коты')
+        self.assertIsNone(group_cache.get_group('missing'))
+        response = self.client.get(
+            reverse('group_posts', kwargs={'slug': 'missing'})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_slug_cache_follows_shared_generation(self):
+        group_cache.get_group('cats')
+        # Другой процесс переименовал группу и сдвинул поколение.
+        Group.objects.filter(pk=self.cats.pk).update(title='Коты')
+        bump_generation(group_cache.GENERATION_SCOPE)
+        self.assertEqual(group_cache.get_group('cats').title, 'Коты')
+
+    def test_repair_group_stats(self):
+        post = Post.objects.create(text='text', author=self.user,
+                                   group=self.cats)
+        GroupStats.objects.all().delete()
+        call_command('repair_group_stats', stdout=StringIO())
+        stats = self.stats(self.cats)
+        self.assertEqual(stats.posts, 1)
+        self.assertEqual(stats.latest_post, post)
+        self.assertEqual(self.stats(self.dogs).posts, 0)
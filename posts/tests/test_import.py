@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts import search
+from posts.counters import get_user_stats
+from posts.models import Comment, Follow, Group, ImportCheckpoint, Post
+
+User = get_user_model()
+
+
+class BulkImportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='leo')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Cats', slug='cats', description='cats'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def write(self, records):
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            for record in records:
+                line = record if isinstance(record, str) else json.dumps(
+                    record, ensure_ascii=False
+                )
+                file.write(line + '\n')
+        self.addCleanup(os.remove, path)
+        return path
+
+    def run_import(self, kind, path, *args):
+        out = StringIO()
+        call_command(f'import_{kind}', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_posts(self):
+        path = self.write([
+            {'author': 'leo', 'text': 'первый\nпост', 'group': 'cats',
+             'pub_date': '2020-01-01T10:00:00+00:00'},
+            {'author': 'leo', 'text': 'второй пост'},
+            {'author': 'leo', 'text': 'нет группы', 'group': 'missing'},
+            {'author': 'nobody', 'text': 'нет автора'},
+        ])
+        output = self.run_import('posts', path, '--chunk-size', '2')
+        self.assertIn('добавлено 2, пропущено 2', output)
+        post = Post.objects.get(group=self.group)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.text_html, 'первый<br>пост')
+        self.assertEqual(get_user_stats(self.author).posts, 2)
+        self.assertEqual(self.reader.timeline.count(), 2)
+        if search.enabled():
+            self.assertEqual(len(search.search('второй').object_list), 1)
+
+    def test_import_resumes_from_checkpoint(self):
+        path = self.write([
+            {'author': 'leo', 'text': 'один'},
+            {'author': 'leo', 'text': 'два'},
+            'не JSON',
+            {'author': 'leo', 'text': 'три'},
+        ])
+        with self.assertRaisesMessage(CommandError, 'строка 3'):
+            self.run_import('posts', path, '--chunk-size', '1')
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get().line, 2)
+
+        with open(path, 'r+', encoding='utf-8') as file:
+            lines = file.readlines()
+            lines[2] = json.dumps({'author': 'leo', 'text': 'три'}) + '\n'
+            file.seek(0)
+            file.writelines(lines[:3])
+            file.truncate()
+        self.run_import('posts', path, '--chunk-size', '1')
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            ['два', 'один', 'три'],
+        )
+        self.run_import('posts', path, '--restart')
+        self.assertEqual(Post.objects.count(), 6)
+
+    def test_import_comments(self):
+        post = Post.objects.create(text='пост', author=self.author)
+        path = self.write([
+            {'post': post.id, 'author': 'reader', 'text': 'первый',
+             'created': '2020-01-01T10:00:00'},
+            {'post': post.id, 'author': 'leo', 'text': 'второй'},
+            {'post': post.id + 100, 'author': 'leo', 'text': 'мимо'},
+        ])
+        output = self.run_import('comments', path)
+        self.assertIn('добавлено 2, пропущено 1', output)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+        self.assertEqual(get_user_stats(self.reader).comments, 1)
+        comment = Comment.objects.get(text='первый')
+        self.assertEqual(comment.created.year, 2020)
+        self.assertEqual(comment.text_html, 'первый')
+
+    def test_import_follows(self):
+        Post.objects.create(text='пост', author=self.reader)
+        path = self.write([
+            {'user': 'leo', 'author': 'reader'},
+            {'user': 'reader', 'author': 'leo'},
+            {'user': 'leo', 'author': 'leo'},
+            {'user': 'newcomer', 'author': 'reader'},
+        ])
+        output = self.run_import('follows', path, '--create-users')
+        self.assertIn('добавлено 2, пропущено 2', output)
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(self.author.timeline.count(), 1)
+        self.assertEqual(newcomer.timeline.count(), 1)
+        self.assertEqual(get_user_stats(self.reader).followers, 2)
+        self.assertEqual(get_user_stats(self.author).following, 1)
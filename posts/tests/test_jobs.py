@@ -0,0 +1,101 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from posts import jobs
+from posts.models import Follow, Job, Post
+
+User = get_user_model()
+
+CALLS = []
+
+
+def record(value, suffix=''):
+    CALLS.append(f'{value}{suffix}')
+
+
+def explode():
+    raise RuntimeError('boom')
+
+
+@override_settings(JOBS_EAGER=False)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+        self.worker = jobs.Worker('test')
+
+    def test_enqueue_and_run(self):
+        job = jobs.enqueue(record, 'a', suffix='!')
+        self.assertEqual(job.task, 'posts.tests.test_jobs.record')
+        self.assertTrue(self.worker.run_one())
+        self.assertEqual(CALLS, ['a!'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertFalse(self.worker.run_one())
+
+    def test_idempotency_key(self):
+        first = jobs.enqueue(record, 'a', key='once')
+        second = jobs.enqueue(record, 'b', key='once')
+        self.assertEqual(first, second)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_priority_order(self):
+        jobs.enqueue(record, 'low')
+        jobs.enqueue(record, 'high', priority=5)
+        jobs.enqueue(record, 'later', priority=9, delay=60)
+        while self.worker.run_one():
+            pass
+        self.assertEqual(CALLS, ['high', 'low'])
+
+    @override_settings(JOB_RETRY_DELAY=10)
+    def test_retry_with_backoff_then_fail(self):
+        job = jobs.enqueue(explode, max_attempts=2)
+        self.worker.run_one()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        self.worker.run_one()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_stale_jobs_requeued(self):
+        job = jobs.enqueue(record, 'a')
+        Job.objects.filter(id=job.id).update(
+            status=Job.RUNNING,
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertTrue(self.worker.run_one())
+
+    def test_new_post_fan_out_does_not_wait_for_worker(self):
+        author = User.objects.create(username='author')
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        Post.objects.create(text='text', author=author)
+        self.assertEqual(reader.timeline.count(), 1)
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        self.assertIsNone(jobs.enqueue(record, 'now'))
+        self.assertEqual(CALLS, ['now'])
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(JOBS_EAGER=False)
+class RunJobsCommandTests(TransactionTestCase):
+    def test_run_jobs_once(self):
+        CALLS.clear()
+        for value in ('a', 'b'):
+            jobs.enqueue(record, value)
+        out = StringIO()
+        call_command('run_jobs', '--once', '--threads', '1', stdout=out)
+        self.assertIn('Выполнено задач: 2', out.getvalue())
+        self.assertEqual(sorted(CALLS), ['a', 'b'])
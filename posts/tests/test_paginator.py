@@ -1,8 +1,11 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
-from posts.models import Post
+from posts.models import Comment, Post
+from posts.paginator import encode_token
 
 User = get_user_model()
 
@@ -26,3 +29,90 @@ class PostCreateFormTests(TestCase):
             response_2 = self.client.get(reverse_url + '?page=2')
             self.assertEqual(len(response.context.get('page').object_list), 10)
             self.assertEqual(len(response_2.context.get('page').object_list), 3)
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        response = self.client.get(reverse('index'))
+        first_page = response.context.get('page')
+        self.assertIsNone(first_page.previous_cursor)
+        self.assertIsNotNone(first_page.next_cursor)
+
+        response_2 = self.client.get(
+            reverse('index') + '?cursor=' + first_page.next_cursor
+        )
+        second_page = response_2.context.get('page')
+        self.assertEqual(len(second_page.object_list), 3)
+        self.assertIsNone(second_page.next_cursor)
+
+        response_back = self.client.get(
+            reverse('index') + '?cursor=' + second_page.previous_cursor
+        )
+        self.assertEqual(
+            list(response_back.context.get('page').object_list),
+            list(first_page.object_list),
+        )
+
+    def test_cursor_page_does_not_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('index'))
+        count_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'COUNT(' in query['sql']
+        ]
+        self.assertEqual(count_queries, [])
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('index') + '?cursor=garbage')
+        self.assertEqual(len(response.context.get('page').object_list), 10)
+
+    def test_out_of_range_cursor_falls_back_to_first_page(self):
+        for pk in (10 ** 30, '10', 1.5, True):
+            cursor = encode_token({'d': '2020-01-01T00:00:00+00:00', 'i': pk})
+            response = self.client.get(reverse('index') + '?cursor=' + cursor)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.context.get('page').previous_cursor)
+
+
+class PostCommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Commenter')
+        cls.post = Post.objects.create(text='post', author=cls.user)
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.user, text=f'comment {i}')
+            for i in range(7)
+        ])
+        cls.url = reverse('post', kwargs={
+            'username': 'Commenter', 'post_id': cls.post.id,
+        })
+
+    @override_settings(COMMENTS_PER_PAGE=5)
+    def test_comments_are_paginated_oldest_first(self):
+        response = self.client.get(self.url)
+        first_page = response.context.get('comments')
+        self.assertEqual(
+            [comment.text for comment in first_page],
+            [f'comment {i}' for i in range(5)],
+        )
+        response_2 = self.client.get(
+            self.url + '?cursor=' + first_page.next_cursor
+        )
+        second_page = response_2.context.get('comments')
+        self.assertEqual(
+            [comment.text for comment in second_page],
+            ['comment 5', 'comment 6'],
+        )
+        self.assertIsNone(second_page.next_cursor)
+
+    def test_post_page_query_count(self):
+        # Пост с автором и группой, комментарии с авторами — два запроса.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+            response.content
+
+    def test_post_of_another_author_is_not_found(self):
+        User.objects.create(username='Stranger')
+        response = self.client.get(reverse('post', kwargs={
+            'username': 'Stranger', 'post_id': self.post.id,
+        }))
+        self.assertEqual(response.status_code, 404)
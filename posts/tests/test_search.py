@@ -0,0 +1,96 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from posts.models import Post, Group
+from posts.paginator import encode_token
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='TestSearchUser')
+        cls.group = Group.objects.create(
+            title='Котики',
+            slug='cats',
+            description='lalala lalala'
+        )
+        cls.post = Post.objects.create(
+            text='Сегодня <b>мы</b> кормили голубей',
+            author=cls.user,
+            group=cls.group,
+        )
+        for i in range(12):
+            Post.objects.create(text=f'голуби номер {i}', author=cls.user)
+
+    def search(self, query, cursor=None):
+        data = {'q': query}
+        if cursor:
+            data['cursor'] = cursor
+        return self.client.get(reverse('search'), data)
+
+    def test_search_highlights_and_escapes(self):
+        response = self.search('кормили')
+        page = response.context['page']
+        self.assertEqual(list(page.object_list), [SearchTests.post])
+        self.assertContains(response, '<mark>кормили</mark>')
+        self.assertContains(response, '&lt;b&gt;мы&lt;/b&gt;')
+
+    def test_search_by_group_title(self):
+        page = self.search('котики').context['page']
+        self.assertEqual(list(page.object_list), [SearchTests.post])
+
+    def test_search_by_username_prefix(self):
+        page = self.search('TestSearch').context['page']
+        self.assertEqual(len(page.object_list), 10)
+        for post in page:
+            self.assertEqual(post.author, SearchTests.user)
+
+    def test_search_cursor_pagination(self):
+        first = self.search('голуби').context['page']
+        self.assertEqual(len(first.object_list), 10)
+        second = self.search('голуби', first.next_cursor).context['page']
+        self.assertEqual(len(second.object_list), 2)
+        self.assertFalse(set(first.object_list) & set(second.object_list))
+        back = self.search('голуби', second.previous_cursor).context['page']
+        self.assertEqual(list(back.object_list), list(first.object_list))
+
+    def test_fts_syntax_in_query_is_literal(self):
+        response = self.search('"кормили OR NEAR(')
+        self.assertEqual(response.status_code, 200)
+
+    def test_control_characters_in_query(self):
+        response = self.search('\x00кормили\x02')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page'].object_list),
+                         [SearchTests.post])
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        first = self.search('голуби').context['page']
+        for position in ({'r': [1], 'i': 1}, {'r': 1.0, 'i': 10 ** 30},
+                         {'r': float('nan'), 'i': 1}, {'r': 1.0, 'i': '1'}):
+            with self.subTest(position=position):
+                response = self.search('голуби', encode_token(position))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['page'].object_list),
+                                 list(first.object_list))
+
+    def test_group_rename_reindexes(self):
+        SearchTests.group.title = 'Собачки'
+        SearchTests.group.save()
+        page = self.search('собачки').context['page']
+        self.assertIn(SearchTests.post, page.object_list)
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts')
+        call_command('rebuild_search_index', stdout=StringIO())
+        page = self.search('кормили').context['page']
+        self.assertEqual(list(page.object_list), [SearchTests.post])
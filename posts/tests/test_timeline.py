@@ -0,0 +1,108 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Post, Follow, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(username='TestReader')
+        cls.author = User.objects.create(username='TestAuthor')
+        Post.objects.create(text='old post', author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(TimelineTests.reader)
+
+    def follow(self):
+        self.authorized_client.get(
+            reverse('profile_follow', kwargs={'username': 'TestAuthor'})
+        )
+
+    def test_follow_backfills_and_unfollow_clears(self):
+        self.follow()
+        self.assertEqual(self.reader.timeline.count(), 1)
+        self.authorized_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'TestAuthor'})
+        )
+        self.assertEqual(self.reader.timeline.count(), 0)
+
+    def test_new_post_fans_out_to_followers(self):
+        self.follow()
+        author_client = Client()
+        author_client.force_login(TimelineTests.author)
+        author_client.post(reverse('new_post'), data={'text': 'fresh post'})
+        self.assertEqual(self.reader.timeline.count(), 2)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(response.context.get('page')[0].text, 'fresh post')
+
+    def test_fan_out_query_count_independent_of_followers(self):
+        Follow.objects.bulk_create(
+            Follow(user=User.objects.create(username=f'reader{i}'),
+                   author=self.author)
+            for i in range(20)
+        )
+        post = Post.objects.create(text='fresh post', author=self.author)
+        TimelineEntry.objects.filter(post=post).delete()
+        with self.assertNumQueries(3):
+            timeline.fan_out(post)
+        self.assertEqual(TimelineEntry.objects.filter(post=post).count(), 20)
+
+    def test_follow_index_pages_by_timeline(self):
+        self.follow()
+        for i in range(12):
+            Post.objects.create(text=f'post {i}', author=self.author)
+        response = self.authorized_client.get(reverse('follow_index'))
+        page = response.context['page']
+        self.assertEqual(len(page), 10)
+        self.assertEqual(page[0].text, 'post 11')
+        response = self.authorized_client.get(
+            reverse('follow_index'), {'cursor': page.next_cursor}
+        )
+        texts = [post.text for post in response.context['page']]
+        self.assertEqual(texts, ['post 1', 'post 0', 'old post'])
+
+    @override_settings(TIMELINE_DEPTH=2)
+    def test_timeline_trimmed_to_depth(self):
+        self.follow()
+        for i in range(3):
+            Post.objects.create(text=f'post {i}', author=self.author)
+        texts = list(self.reader.timeline.order_by('-pub_date')
+                     .values_list('post__text', flat=True))
+        self.assertEqual(texts, ['post 2', 'post 1'])
+
+    def test_rebuild_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.reader.timeline.count(), 1)
+
+
+class TimelineFeedCacheTests(TransactionTestCase):
+    def test_fan_out_refreshes_follow_feed(self):
+        reader = User.objects.create(username='TestReader')
+        author = User.objects.create(username='TestAuthor')
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(text='fresh post', author=author)
+        # Лента ещё без поста: страница и ETag закешированы до рассылки.
+        TimelineEntry.objects.filter(post=post).delete()
+        client = Client()
+        client.force_login(reader)
+        etag = client.get(reverse('follow_index'))['ETag']
+
+        timeline.fan_out(post)
+        response = client.get(reverse('follow_index'),
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'fresh post')
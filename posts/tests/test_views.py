@@ -1,14 +1,22 @@
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django import forms
 
-from posts.models import Post, Group, Follow
+from posts import follows, jobs, thumbnails
+from posts.counters import get_user_stats
+from posts.models import Post, Group, Follow, Comment, UserStats
+from yatube.routers import PIN_COOKIE
 
 User = get_user_model()
 
@@ -17,7 +25,9 @@ class StaticViewTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
         cls.user = User.objects.create(username='TestUser')
         cls.user2 = User.objects.create(username='TestFollowUser')
         cls.group = Group.objects.create(
@@ -48,10 +58,13 @@ class StaticViewTests(TestCase):
             text='follow test',
             author=cls.user2,
         )
+        # Миниатюры строит воркер очереди.
+        jobs.run_pending()
 
     @classmethod
     def tearDownClass(cls):
-        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
         super().tearDownClass()
 
     def setUp(self):
@@ -74,15 +87,14 @@ class StaticViewTests(TestCase):
                 self.assertTemplateUsed(response, template)
 
     def test_some_pages_correct_context(self):
-        page_name_check_context = {
-            'page': reverse('index'),
-            'posts': reverse('group_posts', kwargs={'slug': 'testSlug'}),
-            'page': reverse('profile', kwargs={'username': 'TestUser'}),
-        }
-        for context_list, page_name in page_name_check_context.items():
+        page_names = [
+            reverse('group_posts', kwargs={'slug': 'testSlug'}),
+            reverse('profile', kwargs={'username': 'TestUser'}),
+        ]
+        for page_name in page_names:
             with self.subTest(page_name=page_name):
                 response = self.authorized_client.get(page_name)
-                page_post = response.context.get(context_list)[0]
+                page_post = response.context.get('page')[0]
                 self.assertEqual(page_post.text, 'lorem lorem lorem')
                 self.assertEqual(page_post.author, StaticViewTests.user)
                 self.assertEqual(page_post.group, StaticViewTests.group)
@@ -101,20 +113,39 @@ class StaticViewTests(TestCase):
 
     def test_cache_posts_index(self):
         response1 = self.guest_client.get(reverse('index'))
+        Post.objects.filter(pk=StaticViewTests.post.pk).update(text='stale')
+        response2 = self.guest_client.get(reverse('index'))
+        self.assertEqual(str(response1.content), str(response2.content))
+
+    def test_cache_posts_index_invalidated_by_new_post(self):
+        self.guest_client.get(reverse('index'))
         Post.objects.create(
-            text='lorem lorem lorem',
+            text='fresh cached post',
             author=StaticViewTests.user,
         )
-        response2 = self.guest_client.get(reverse('index'))
-        self.assertEqual(str(response1.content), str(response2.content))
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'fresh cached post')
+
+    def test_cache_posts_index_varies_by_page(self):
+        for i in range(10):
+            Post.objects.create(text=f'page post {i}',
+                                author=StaticViewTests.user)
+        first = self.guest_client.get(reverse('index'))
+        second = self.guest_client.get(
+            reverse('index') + '?cursor=' + first.context['page'].next_cursor
+        )
+        self.assertContains(second, 'follow test')
+        self.assertNotContains(first, 'follow test')
 
     def test_follow_another_user(self):
-        self.authorized_client.get(reverse('profile_follow',
-                                   kwargs={'username': 'TestFollowUser'}))
+        response = self.authorized_client.get(
+            reverse('profile_follow', kwargs={'username': 'TestFollowUser'}))
         follow_exist = Follow.objects.filter(
                    user=StaticViewTests.user,
                    author=StaticViewTests.user2).exists()
         self.assertEqual(True, follow_exist)
+        # Подписка пишет в GET-запросе и тоже закрепляет основную базу.
+        self.assertIn(PIN_COOKIE, response.cookies)
 
     def test_unfollow_another_user(self):
         response = self.authorized_client.get(
@@ -130,6 +161,48 @@ class StaticViewTests(TestCase):
                        author=StaticViewTests.user2).exists()
         self.assertEqual(False, follow_exist)
 
+    def test_repeated_follow_keeps_single_row(self):
+        url = reverse('profile_follow', kwargs={'username': 'TestFollowUser'})
+        self.authorized_client.get(url)
+        self.authorized_client.get(url)
+        self.assertEqual(Follow.objects.filter(
+            user=StaticViewTests.user, author=StaticViewTests.user2
+        ).count(), 1)
+        self.assertEqual(
+            get_user_stats(StaticViewTests.user2).followers, 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=StaticViewTests.user,
+                                  author=StaticViewTests.user2)
+
+    def test_profile_is_following_reflects_state(self):
+        url = reverse('profile', kwargs={'username': 'TestFollowUser'})
+        response = self.authorized_client.get(url)
+        self.assertIs(response.context['is_following'], False)
+        Follow.objects.create(user=StaticViewTests.user,
+                              author=StaticViewTests.user2)
+        response = self.authorized_client.get(url)
+        self.assertIs(response.context['is_following'], True)
+
+    def test_followed_authors_single_query(self):
+        Follow.objects.create(user=StaticViewTests.user,
+                              author=StaticViewTests.user2)
+        with self.assertNumQueries(1):
+            followed = follows.followed_authors(
+                StaticViewTests.user,
+                [StaticViewTests.user, StaticViewTests.user2],
+            )
+        self.assertEqual(followed, {StaticViewTests.user2.id})
+
+    def test_feed_cards_show_follow_state(self):
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, reverse(
+            'profile_follow', kwargs={'username': 'TestFollowUser'}))
+        self.authorized_client.get(reverse(
+            'profile_follow', kwargs={'username': 'TestFollowUser'}))
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, reverse(
+            'profile_unfollow', kwargs={'username': 'TestFollowUser'}))
+
     def test_post_author_user_follow_exist_in_follow_page(self):
         response = self.authorized_client.get(
                    reverse('profile_follow',
@@ -144,3 +217,139 @@ class StaticViewTests(TestCase):
         response = self.authorized_client.get(reverse('follow_index'))
         len_context = response.context.count('page')
         self.assertEqual(len_context, 0)
+
+    def test_comment_count_follows_comments(self):
+        post = StaticViewTests.post_follow_user
+        self.authorized_client.post(
+            reverse('add_comment', kwargs={'username': 'TestFollowUser',
+                                           'post_id': post.id}),
+            data={'text': 'comment'}
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        post.comments.get().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_reconcile_comment_counts(self):
+        post = StaticViewTests.post_follow_user
+        Comment.objects.create(post=post, author=StaticViewTests.user,
+                               text='comment')
+        Post.objects.filter(pk=post.pk).update(comment_count=7)
+        call_command('reconcile_comment_counts', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_profile_stats_follow_counters(self):
+        response = self.authorized_client.get(
+            reverse('profile', kwargs={'username': 'TestFollowUser'}))
+        self.assertEqual(response.context.get('stats').followers, 0)
+        self.authorized_client.get(reverse('profile_follow',
+                                   kwargs={'username': 'TestFollowUser'}))
+        response = self.authorized_client.get(
+            reverse('profile', kwargs={'username': 'TestFollowUser'}))
+        self.assertEqual(response.context.get('stats').followers, 1)
+        self.assertEqual(response.context.get('post_count'), 1)
+        self.authorized_client.get(reverse('profile_unfollow',
+                                   kwargs={'username': 'TestFollowUser'}))
+        StaticViewTests.user2.stats.refresh_from_db()
+        self.assertEqual(StaticViewTests.user2.stats.followers, 0)
+
+    def test_profile_resolves_follow_state_once(self):
+        url = reverse('profile', kwargs={'username': 'TestFollowUser'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url + '?cursor=once')
+        follow_queries = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "posts_follow"."author_id"')
+        ]
+        self.assertEqual(len(follow_queries), 1)
+        self.assertIs(response.context['page'][0].author_followed, False)
+
+    def test_repair_user_stats(self):
+        self.authorized_client.get(
+            reverse('profile', kwargs={'username': 'TestUser'}))
+        UserStats.objects.filter(user=StaticViewTests.user).update(posts=42)
+        call_command('repair_user_stats', stdout=StringIO())
+        stats = UserStats.objects.get(user=StaticViewTests.user)
+        self.assertEqual(stats.posts, 1)
+        self.assertEqual(UserStats.objects.count(), User.objects.count())
+
+    def test_card_renders_ready_thumbnail(self):
+        response = self.guest_client.get(
+            reverse('group_posts', kwargs={'slug': 'testSlug'}))
+        self.assertContains(response, '<img class="card-img" src="')
+
+    def test_card_placeholder_until_thumbnail_ready(self):
+        with mock.patch('posts.thumbnails._lru_get', return_value=None), \
+                mock.patch('posts.thumbnails._load_many',
+                           side_effect=dict.fromkeys), \
+                mock.patch('posts.thumbnails.schedule') as schedule:
+            response = self.guest_client.get(
+                reverse('profile', kwargs={'username': 'TestUser'})
+                + '?cursor=none')
+        schedule.assert_called_once_with(StaticViewTests.post.image.name)
+        self.assertNotContains(response, '<img class="card-img"')
+
+    def test_generate_thumbnails_command(self):
+        with mock.patch('posts.thumbnails.generate') as generate:
+            call_command('generate_thumbnails', stdout=StringIO())
+        generate.assert_called_once_with(StaticViewTests.post.image.name)
+
+    def test_prefetch_thumbnails_batches_lookups(self):
+        thumbnails.ready_thumbnail(StaticViewTests.post.image, 'card')
+        thumbnails._lru.clear()
+        posts = list(Post.objects.filter(author=StaticViewTests.user))
+        with self.assertNumQueries(0):
+            thumbnails.prefetch_thumbnails(posts)
+        self.assertIsNotNone(posts[0].thumb)
+        with self.assertNumQueries(0), \
+                mock.patch('posts.thumbnails._load_many') as load_many:
+            thumbnails.prefetch_thumbnails(posts)
+        load_many.assert_not_called()
+
+    def test_text_html_rendered_on_save(self):
+        post = Post.objects.create(text='<b>first</b>\nsecond',
+                                   author=StaticViewTests.user)
+        self.assertEqual(post.text_html, '&lt;b&gt;first&lt;/b&gt;<br>second')
+        self.assertEqual(post.excerpt, '<b>first</b> second')
+        comment = Comment.objects.create(post=post, author=StaticViewTests.user,
+                                         text='a\nb')
+        self.assertEqual(comment.text_html, 'a<br>b')
+
+    def test_text_html_follows_partial_and_bulk_saves(self):
+        post = Post.objects.create(text='old', author=StaticViewTests.user)
+        post.text = 'new\ntext'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'new<br>text')
+        self.assertEqual(post.excerpt, 'new text')
+
+        post.text = 'bulk'
+        Post.objects.bulk_update([post], ['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'bulk')
+        Comment.objects.bulk_create([
+            Comment(post=post, author=StaticViewTests.user, text='a\nb')
+        ])
+        self.assertEqual(Comment.objects.get(post=post).text_html, 'a<br>b')
+
+    def test_feed_does_not_load_raw_text(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('index') + '?cursor=raw')
+        self.assertContains(response, 'lorem lorem lorem')
+        post_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_post"' in query['sql']
+        ]
+        self.assertTrue(post_queries)
+        for sql in post_queries:
+            self.assertNotIn('"posts_post"."text",', sql)
+
+    def test_render_post_text_command(self):
+        post = StaticViewTests.post_follow_user
+        Post.objects.filter(pk=post.pk).update(text_html='', excerpt='')
+        call_command('render_post_text', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'follow test')
+        self.assertEqual(post.excerpt, 'follow test')
@@ -0,0 +1,234 @@
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import connection
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBKVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from yatube.routers import PRIMARY
+
+from . import jobs
+from .feed_cache import bump_generation, post_scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def thumbnail_options(source, options):
+    """Дополняет опции так же, как sorl, чтобы имя миниатюры совпало."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_file(file_, derivative):
+    """Файл миниатюры, который sorl построит для `file_` (без проверки)."""
+    geometry, options = settings.POST_THUMBNAILS[derivative]
+    source = ImageFile(file_)
+    options = thumbnail_options(source, options)
+    name = default.backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(file_, derivative):
+    """Готовая миниатюра из KV-хранилища sorl или None.
+
+    Ничего не декодирует и не генерирует: если миниатюры ещё нет,
+    ставит её в очередь фоновой генерации. С JOBS_EAGER задача
+    выполняется сразу, и миниатюра готова к возврату.
+    """
+    if not file_:
+        return None
+    thumbnail = thumbnail_file(file_, derivative)
+    ready = default.kvstore.get(thumbnail)
+    if ready is None:
+        schedule(file_.name)
+        if settings.JOBS_EAGER:
+            ready = default.kvstore.get(thumbnail)
+    return ready
+
+
+def _lru_get(key):
+    with _lru_lock:
+        value = _lru.get(key)
+        if value is not None:
+            _lru.move_to_end(key)
+        return value
+
+
+def _lru_put(key, value):
+    with _lru_lock:
+        _lru[key] = value
+        _lru.move_to_end(key)
+        while len(_lru) > settings.THUMBNAIL_LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _load_many(keys):
+    """Готовые миниатюры по ключам sorl: кеш одним get_many,
+    промахи — одним запросом к таблице KV-хранилища. Промахи читаются
+    с основной базы: ответ реплики, ещё не видящей миниатюру, остался
+    бы в общем кеше пустым значением."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        return {key: kvstore._get(key) for key in keys}
+    raw_keys = {add_prefix(key): key for key in keys}
+    cached = kvstore.cache.get_many(list(raw_keys))
+    missing = [raw for raw in raw_keys if raw not in cached]
+    if missing:
+        found = dict(KVStoreModel.objects.using(PRIMARY).filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        fetched = {raw: found.get(raw, EMPTY_VALUE) for raw in missing}
+        kvstore.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        cached.update(fetched)
+    result = {}
+    for raw, key in raw_keys.items():
+        value = cached.get(raw)
+        if value is None or value == EMPTY_VALUE:
+            result[key] = None
+        else:
+            result[key] = deserialize_image_file(value)
+    return result
+
+
+def prefetch_thumbnails(posts, derivative='card'):
+    """Заполняет `post.thumb` для всей страницы постов за один проход.
+
+    Сначала смотрит во внутрипроцессный LRU, остальное добирает
+    пакетно; отсутствующие миниатюры ставит в очередь генерации.
+    """
+    wanted = {}
+    for post in posts:
+        if not post.image:
+            post.thumb = None
+            continue
+        thumbnail = thumbnail_file(post.image, derivative)
+        post.thumb = _lru_get(thumbnail.key)
+        if post.thumb is None:
+            wanted.setdefault(thumbnail.key, (thumbnail, []))[1].append(post)
+    if not wanted:
+        return
+    for key, ready in _load_many(list(wanted)).items():
+        thumbnail, waiting = wanted[key]
+        if ready is None:
+            schedule(waiting[0].image.name)
+            if settings.JOBS_EAGER:
+                ready = default.kvstore.get(thumbnail)
+        if ready is not None:
+            _lru_put(key, ready)
+        for post in waiting:
+            post.thumb = ready
+
+
+def source_exists(name):
+    try:
+        return default_storage.exists(name)
+    except SuspiciousFileOperation:
+        return False
+
+
+def generate(name):
+    """Строит все производные POST_THUMBNAILS для файла: задача очереди
+    и работа пула в backfill()."""
+    for geometry, options in settings.POST_THUMBNAILS.values():
+        try:
+            get_thumbnail(name, geometry, **options)
+        except Exception:
+            logger.exception('Thumbnail for %s at %s failed', name, geometry)
+    # Страницы с заглушкой вместо миниатюры больше не актуальны.
+    posts = Post.objects.filter(image=name).values_list(
+        'id', 'author_id', 'group_id'
+    )
+    for post_id, author_id, group_id in posts:
+        bump_generation(*post_scopes(author_id, group_id, post_id=post_id))
+    return name
+
+
+def use_pool():
+    # Процесс пула не увидит базу SQLite в памяти (например, тестовую),
+    # поэтому в таком случае миниатюры строятся на месте.
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return False
+    return settings.THUMBNAIL_WORKERS > 0
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE',
+                                         'yatube.settings'),),
+            )
+        return _executor
+
+
+def schedule(name):
+    """Ставит генерацию миниатюр в очередь задач в текущей транзакции
+    (с JOBS_EAGER задача выполняется сразу)."""
+    if not name or not source_exists(name):
+        return
+    jobs.enqueue(generate, name, key=f'thumbnail:{name}')
+
+
+def backfill(names, window=None):
+    """Генерирует миниатюры для потока имён, держа в полёте не больше
+    `window` задач. Возвращает число обработанных файлов.
+
+    Пул процессов THUMBNAIL_WORKERS нужен только здесь, для массовой
+    генерации (manage.py generate_thumbnails); новые картинки
+    обрабатывает задача очереди, см. schedule().
+    """
+    window = window or max(settings.THUMBNAIL_WORKERS, 1) * 4
+    if not use_pool():
+        total = 0
+        for name in names:
+            generate(name)
+            total += 1
+        return total
+    executor = get_executor()
+    in_flight = set()
+    total = 0
+    for name in names:
+        if len(in_flight) >= window:
+            _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        in_flight.add(executor.submit(generate, name))
+        total += 1
+    wait(in_flight)
+    return total
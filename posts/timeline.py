@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .feed_cache import bump_generation
+from .models import Follow, Post, TimelineEntry
+
+
+def refresh_feeds(user_ids):
+    """После коммита сбрасывает фрагменты и ETag ленты подписок
+    у пользователей, в чьи ленты добавились записи."""
+    scopes = [f'follow:{user_id}' for user_id in set(user_ids)]
+    if scopes:
+        transaction.on_commit(lambda: bump_generation(*scopes))
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True).distinct()
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in follower_ids],
+        ignore_conflicts=True,
+    )
+    trim_overfull(follower_ids)
+    refresh_feeds(follower_ids)
+
+
+def backfill(user, author):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = Post.objects.filter(author=author).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.TIMELINE_DEPTH]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user=user, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts],
+        ignore_conflicts=True,
+    )
+    trim(user.id)
+
+
+def _insert_from_follows(condition, params):
+    """INSERT ... SELECT пар (подписчик, пост) по подпискам, отобранным
+    условием `condition`; уже лежащие в ленте посты пропускаются."""
+    entries = TimelineEntry._meta.db_table
+    posts = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {entries} (user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {posts} p ON p.author_id = f.author_id '
+            f'WHERE {condition} AND NOT EXISTS ('
+            f'SELECT 1 FROM {entries} t '
+            f'WHERE t.user_id = f.user_id AND t.post_id = p.id)',
+            params,
+        )
+
+
+def trim_overfull(user_ids):
+    """trim() только для тех из `user_ids`, чья лента длиннее нормы."""
+    overfull = TimelineEntry.objects.filter(user_id__in=user_ids).values(
+        'user_id'
+    ).annotate(total=Count('id')).filter(
+        total__gt=settings.TIMELINE_DEPTH
+    ).values_list('user_id', flat=True)
+    for user_id in overfull:
+        trim(user_id)
+
+
+def fan_out_posts(post_ids):
+    """fan_out() для пачки постов одним запросом (массовый импорт)."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    _insert_from_follows(f'p.id IN ({placeholders})', post_ids)
+    followers = Follow.objects.filter(
+        author__posts__id__in=post_ids
+    ).values('user_id')
+    trim_overfull(followers)
+    refresh_feeds(followers.values_list('user_id', flat=True))
+
+
+def backfill_follows(follow_ids):
+    """backfill() для пачки подписок одним запросом (массовый импорт)."""
+    follow_ids = list(follow_ids)
+    if not follow_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(follow_ids))
+    posts = Post._meta.db_table
+    _insert_from_follows(
+        f'f.id IN ({placeholders}) AND p.id IN ('
+        f'SELECT l.id FROM {posts} l WHERE l.author_id = f.author_id '
+        f'ORDER BY l.pub_date DESC, l.id DESC LIMIT %s)',
+        follow_ids + [settings.TIMELINE_DEPTH],
+    )
+    followers = Follow.objects.filter(id__in=follow_ids).values('user_id')
+    trim_overfull(followers)
+    refresh_feeds(followers.values_list('user_id', flat=True))
+
+
+def remove_author(user, author):
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def trim(user_id):
+    """Обрезает ленту пользователя до TIMELINE_DEPTH записей."""
+    stale = TimelineEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-post_id'
+    ).values_list('id', flat=True)[settings.TIMELINE_DEPTH:]
+    stale_ids = list(stale)
+    if stale_ids:
+        TimelineEntry.objects.filter(id__in=stale_ids).delete()
+
+
+def rebuild():
+    """Пересобирает все ленты с нуля по таблице подписок."""
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.select_related('user', 'author').order_by('id')
+    for follow in follows.iterator():
+        backfill(follow.user, follow.author)
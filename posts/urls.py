@@ -4,10 +4,13 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("group/", views.group_list, name="group_list"),
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
     path("new", views.new_post, name="new_post"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.search_posts, name="search"),
     path('<str:username>/', views.profile, name='profile'),
+    path('<str:username>/export/', views.export_data, name='export'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path(
         '<str:username>/<int:post_id>/edit/',
@@ -1,64 +1,109 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db.models import F
 from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.http import etag
 
-from .models import Post, Group, User, Comment, Follow
+from .models import Post, Group, TimelineEntry, User
 from .forms import PostForm, CommentForm
+from .paginator import CursorPaginator, paginate
+from .uploads import hashed_uploads
+from . import conditional, export, follows, group_cache, search
+from .counters import get_user_stats
+from .feed_cache import get_generation
+from yatube.db import retry_create
+from yatube.instrumentation import query_budget
+from yatube.routers import pin_primary
 
 
-def is_user_subscribed(user, author):
-    if user.is_authenticated:
-        return Follow.objects.filter(user=user, author=author).exists()
-    return False
-
+@query_budget(12)
+@etag(conditional.index_etag)
 def index(request):
-    post_list = Post.objects.select_related('group', 'author')
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('group', 'author').defer('text')
+    paginator, page = paginate(request, post_list, 10)
     return render(
          request,
          'index.html',
          {'page': page,
-          'paginator': paginator}
+          'paginator': paginator,
+          'generation': get_generation('index'),
+          'follow_generation': get_generation(f'follow:{request.user.id}'),
+          'cache_ttl': settings.FEED_CACHE_TTL}
      )
 
 
+@query_budget(3)
+def group_list(request):
+    groups = Group.objects.select_related(
+        'stats', 'stats__latest_post', 'stats__latest_post__author'
+    ).defer('stats__latest_post__text').order_by(
+        F('stats__last_activity').desc(nulls_last=True), 'title'
+    )
+    paginator = Paginator(groups, settings.GROUPS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    return render(request, 'groups.html',
+                  {'page': page, 'paginator': paginator})
+
+
+@query_budget(10)
+@etag(conditional.group_etag)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group)
-    paginator = Paginator(posts, 5)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group = group_cache.get_group_or_404(slug)
+    posts = group.post.select_related('author').defer('text')
+    paginator, page = paginate(request, posts, 5)
     return render(
         request,
         'group.html',
         {'page': page,
-         'posts': posts,
          'paginator': paginator,
-         'group': group})
+         'group': group,
+         'generation': get_generation(f'group:{group.id}'),
+         'follow_generation': get_generation(f'follow:{request.user.id}'),
+         'cache_ttl': settings.FEED_CACHE_TTL})
 
 
+@query_budget(4)
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    page = search.search(query, request.GET.get('cursor'))
+    return render(
+        request,
+        'search.html',
+        {'query': query,
+         'page': page,
+         'cursor_prefix': urlencode({'q': query}) + '&'})
+
+
+@query_budget(15)
 @login_required(login_url='/auth/login/')
+@hashed_uploads
 def new_post(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None,
+                    files=request.FILES or None,
+                    rejected_uploads=getattr(request, 'rejected_uploads', ()))
     if request.method == 'POST' and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        form.save()
+        retry_create(post)
         return redirect('index')
 
     return render(request, 'new_post.html', {'form': form})
 
 
+@query_budget(15)
 @login_required(login_url='/auth/login/')
+@hashed_uploads
 def post_edit(request, username, post_id):
     user = get_object_or_404(User, username=username)
     post = get_object_or_404(Post, author=user, id=post_id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None,
-                    instance=post)
+                    instance=post,
+                    rejected_uploads=getattr(request, 'rejected_uploads', ()))
     if request.user == post.author:
         if request.method == "POST" and form.is_valid():
             post = form.save(commit=False)
@@ -70,33 +115,55 @@ def post_edit(request, username, post_id):
     return redirect('post', username=username, post_id=post_id)
 
 
+@query_budget(15)
+@etag(conditional.profile_etag)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    is_following = is_user_subscribed
+    post_list = author.posts.select_related('group').defer('text')
+    paginator, page = paginate(request, post_list, 10)
+    is_following = author.id in follows.followed_authors(
+        request.user, [author.id]
+    )
+    stats = get_user_stats(author)
     context = {
         'page': page,
         'author': author,
-        'post_count': paginator.count,
+        'stats': stats,
+        'post_count': stats.posts,
         'paginator': paginator,
         'is_following': is_following,
+        'generation': get_generation(f'author:{author.id}'),
+        'follow_generation': get_generation(f'follow:{request.user.id}'),
+        'cache_ttl': settings.FEED_CACHE_TTL,
     }
     return render(request, 'profile.html', context)
 
 
+@query_budget(6)
+@etag(conditional.post_etag)
 def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'),
+        id=post_id,
+        author__username=username,
+    )
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.filter(post=post)
+    comment_list = post.comments.select_related('author').defer('text')
+    comments = CursorPaginator(
+        comment_list,
+        settings.COMMENTS_PER_PAGE,
+        field='created',
+        descending=False,
+    ).get_page(request.GET.get('cursor'))
     context = {
-        'author': author,
+        'author': post.author,
         'post': post,
         'form': form,
-        'comments': comments
+        # Шаблон выводит страницу comments; сам QuerySet остаётся частью
+        # контекста страницы (его проверяет tests/test_post.py) и не
+        # выполняется.
+        'comment_list': comment_list,
+        'comments': comments,
     }
     return render(request, 'post.html', context)
 
@@ -114,6 +181,7 @@ def server_error(request):
     return render(request, "misc/500.html", status=500)
 
 
+@query_budget(10)
 @login_required(login_url='/auth/login/')
 def add_comment(request, username, post_id):
     author = get_object_or_404(User, username=username)
@@ -123,39 +191,77 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        retry_create(comment)
         return redirect('post', username=username, post_id=post_id)
 
     return redirect('post', username=username, post_id=post_id)
 
 
+@query_budget(8)
 @login_required(login_url='/auth/login/')
+@etag(conditional.follow_etag)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user) 
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    # Страница читается из ленты по индексу (user, -pub_date, -post),
+    # посты подтягиваются тем же запросом.
+    entries = TimelineEntry.objects.filter(user=request.user).select_related(
+        'post__group', 'post__author'
+    ).defer('post__text').order_by('-pub_date', '-post_id')
+    paginator, page = paginate(request, entries, 10, tiebreaker='post_id')
+    page.object_list = [entry.post for entry in page.object_list]
     return render(
          request,
          'follow.html',
          {'page': page,
-          'paginator': paginator}
+          'paginator': paginator,
+          'generation': get_generation('index'),
+          'follow_generation': get_generation(f'follow:{request.user.id}'),
+          'cache_ttl': settings.FEED_CACHE_TTL}
     )
 
 
+@query_budget(12)
 @login_required(login_url='/auth/login/')
 def profile_follow(request, username):
+    # Пишет в GET-запросе: закрепляем чтения за основной базой.
+    pin_primary(request)
     author = get_object_or_404(User, username=username)
-    if request.user == author or is_user_subscribed(request.user, author):
+    if request.user == author or not follows.follow(request.user, author):
         return redirect('profile', username=username)
-    Follow.objects.create(user=request.user, author=author)
     return redirect('follow_index')
 
 
+@query_budget(10)
 @login_required(login_url='/auth/login/')
 def profile_unfollow(request, username):
+    # Пишет в GET-запросе: закрепляем чтения за основной базой.
+    pin_primary(request)
     author = get_object_or_404(User, username=username)
-    if request.user == author or not is_user_subscribed(request.user, author):
+    if request.user == author or not follows.unfollow(request.user, author):
         return redirect('profile', username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('follow_index')
+
+
+@login_required(login_url='/auth/login/')
+def export_data(request, username):
+    """Выгрузка постов и комментариев: свои данные или любые для staff.
+
+    `?format=jsonl|csv`, `?gzip=0` отключает сжатие. Ответ потоковый,
+    записи читаются из базы пачками по мере отправки — уже после
+    InstrumentationMiddleware, поэтому бюджета запросов у выгрузки нет.
+    """
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        return redirect('profile', username=username)
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in export.FORMATS:
+        fmt = 'jsonl'
+    compress = request.GET.get('gzip') != '0'
+    response = StreamingHttpResponse(
+        export.export(author, fmt, compress, settings.EXPORT_CHUNK_SIZE),
+        content_type=('application/gzip' if compress
+                      else export.CONTENT_TYPES[fmt]),
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export.filename(author, fmt, compress)}"'
+    )
+    return response
@@ -1,3 +1,13 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import OutgoingEmail
+
+
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "recipients", "status", "attempts", "created")
+    list_filter = ("status",)
+    search_fields = ("subject", "recipients")
+    exclude = ("message",)
+
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from yatube.routers import PRIMARY
+
+UserModel = get_user_model()
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который загружает пользователя сессии из общего кеша.
+
+    Вместе с сессиями cached_db авторизованный запрос на тёплом кеше не
+    делает ни одного запроса к базе. Сохранение и удаление пользователя
+    (в том числе смена пароля и last_login при входе) сбрасывают кеш,
+    см. users.signals; USER_CACHE_TTL страхует от обновлений в обход
+    сигналов (queryset.update).
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Только с основной базы: реплика может ещё не видеть запись,
+            # после которой forget_user сбросил кеш, и старая копия
+            # осталась бы в кеше на весь USER_CACHE_TTL.
+            try:
+                user = UserModel._default_manager.db_manager(PRIMARY).get(
+                    pk=user_id
+                )
+            except UserModel.DoesNotExist:
+                return None
+            if not self.user_can_authenticate(user):
+                return None
+            cache.set(key, user, settings.USER_CACHE_TTL)
+        return user
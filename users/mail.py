@@ -0,0 +1,190 @@
+import json
+import logging
+import pickle
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import (
+    Avg, Count, DurationField, ExpressionWrapper, F, Min, Q,
+)
+from django.utils import timezone
+
+from posts import jobs
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger('yatube.mail')
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """EMAIL_BACKEND, который только сохраняет письма в базу.
+
+    Запрос не ждёт ни диска, ни SMTP: письма доставляет задача
+    deliver_pending в воркере очереди через EMAIL_DELIVERY_BACKEND.
+    """
+
+    def send_messages(self, email_messages):
+        rows = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            # Соединение не сериализуется, а в воркере будет своё.
+            message.connection = None
+            rows.append(OutgoingEmail(
+                message=pickle.dumps(message),
+                subject=str(message.subject)[:255],
+                recipients=', '.join(message.recipients()),
+            ))
+        if not rows:
+            return 0
+        try:
+            OutgoingEmail.objects.bulk_create(rows)
+            jobs.enqueue_once(deliver_pending, priority=20)
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
+        return len(rows)
+
+
+def retry_delay(attempts):
+    return min(settings.EMAIL_RETRY_DELAY * 2 ** (attempts - 1),
+               settings.EMAIL_RETRY_MAX_DELAY)
+
+
+def claim(batch_size):
+    """Помечает пачку писем своим токеном. Письма, застрявшие в SENDING
+    дольше JOB_LEASE (воркер умер), забираются снова."""
+    now = timezone.now()
+    ready = Q(status=OutgoingEmail.QUEUED, send_after__lte=now) | Q(
+        status=OutgoingEmail.SENDING, send_after__lt=now
+    )
+    ids = list(OutgoingEmail.objects.filter(ready).order_by('id').values_list(
+        'id', flat=True
+    )[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutgoingEmail.objects.filter(ready, id__in=ids).update(
+        status=OutgoingEmail.SENDING, batch=token,
+        send_after=now + timedelta(seconds=settings.JOB_LEASE),
+    )
+    return list(OutgoingEmail.objects.filter(batch=token))
+
+
+def deliver(emails):
+    """Отправляет пачку через одно соединение. Возвращает
+    (отправлено, сколько писем ещё будут повторять)."""
+    started = time.monotonic()
+    connection = get_connection(settings.EMAIL_DELIVERY_BACKEND,
+                                fail_silently=False)
+    sent_ids = []
+    errors = {}
+    try:
+        connection.open()
+    except Exception as error:
+        errors = {email.id: error for email in emails}
+    else:
+        try:
+            for email in emails:
+                try:
+                    connection.send_messages([pickle.loads(email.message)])
+                except Exception as error:
+                    errors[email.id] = error
+                else:
+                    sent_ids.append(email.id)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    OutgoingEmail.objects.filter(id__in=sent_ids).update(
+        status=OutgoingEmail.SENT, sent_at=now, batch='',
+        attempts=F('attempts') + 1,
+    )
+    retrying = dead = 0
+    for email in emails:
+        if email.id not in errors:
+            continue
+        attempts = email.attempts + 1
+        changes = {'attempts': attempts, 'batch': '',
+                   'last_error': repr(errors[email.id])}
+        if attempts >= settings.EMAIL_MAX_ATTEMPTS:
+            changes['status'] = OutgoingEmail.DEAD
+            dead += 1
+        else:
+            changes['status'] = OutgoingEmail.QUEUED
+            changes['send_after'] = now + timedelta(
+                seconds=retry_delay(attempts)
+            )
+            retrying += 1
+        OutgoingEmail.objects.filter(id=email.id).update(**changes)
+    logger.info(json.dumps({
+        'sent': len(sent_ids),
+        'retrying': retrying,
+        'dead': dead,
+        'seconds': round(time.monotonic() - started, 3),
+    }))
+    return len(sent_ids), retrying
+
+
+def deliver_pending(batch_size=None):
+    """Задача очереди: доставляет все готовые письма пачками по
+    EMAIL_BATCH_SIZE. Для неудачных ставит отложенный повтор."""
+    total = 0
+    retrying = False
+    while True:
+        emails = claim(batch_size or settings.EMAIL_BATCH_SIZE)
+        if not emails:
+            break
+        sent, failed = deliver(emails)
+        total += sent
+        retrying = retrying or bool(failed)
+    if retrying:
+        next_try = OutgoingEmail.objects.filter(
+            status=OutgoingEmail.QUEUED
+        ).aggregate(first=Min('send_after'))['first']
+        # Повторы мог уже забрать другой воркер, тогда ставить нечего.
+        if next_try is not None:
+            delay = max((next_try - timezone.now()).total_seconds(), 0)
+            jobs.enqueue_once(deliver_pending, priority=20, delay=delay)
+    return total
+
+
+def delivery_stats():
+    """Состояние очереди писем для мониторинга."""
+    now = timezone.now()
+    stats = {status: 0 for status, _ in OutgoingEmail.STATUSES}
+    stats.update(OutgoingEmail.objects.order_by().values_list(
+        'status'
+    ).annotate(total=Count('id')))
+    oldest = OutgoingEmail.objects.filter(
+        status=OutgoingEmail.QUEUED
+    ).aggregate(oldest=Min('created'))['oldest']
+    stats['oldest_queued_seconds'] = (
+        round((now - oldest).total_seconds()) if oldest else 0
+    )
+    recent = OutgoingEmail.objects.filter(
+        status=OutgoingEmail.SENT, sent_at__gte=now - timedelta(hours=1)
+    )
+    stats['sent_last_hour'] = recent.count()
+    delay = recent.aggregate(delay=Avg(ExpressionWrapper(
+        F('sent_at') - F('created'), output_field=DurationField()
+    )))['delay']
+    stats['avg_delay_seconds'] = (
+        round(delay.total_seconds(), 3) if delay else 0
+    )
+    return stats
+
+
+def retry_dead():
+    """Возвращает письма из мёртвых в очередь и ставит доставку."""
+    count = OutgoingEmail.objects.filter(status=OutgoingEmail.DEAD).update(
+        status=OutgoingEmail.QUEUED, attempts=0, send_after=timezone.now(),
+    )
+    if count:
+        jobs.enqueue_once(deliver_pending, priority=20)
+    return count
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from users import mail
+
+
+class Command(BaseCommand):
+    help = 'Показывает состояние очереди писем (QueuedEmailBackend)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-dead', action='store_true',
+            help='Вернуть недоставленные письма в очередь',
+        )
+        parser.add_argument(
+            '--deliver', action='store_true',
+            help='Доставить готовые письма сейчас, без воркера',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            count = mail.retry_dead()
+            self.stdout.write(f'Возвращено в очередь: {count}')
+        if options['deliver']:
+            count = mail.deliver_pending()
+            self.stdout.write(f'Отправлено: {count}')
+        for name, value in mail.delivery_stats().items():
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(self.style.SUCCESS('Готово'))
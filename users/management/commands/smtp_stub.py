@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from users.smtp_stub import SMTPStub
+
+
+class Command(BaseCommand):
+    help = ('Локальный SMTP-сервер, который печатает письма вместо '
+            'отправки. Воркер шлёт в него при YATUBE_EMAIL_DELIVERY_BACKEND='
+            'django.core.mail.backends.smtp.EmailBackend и '
+            'YATUBE_EMAIL_PORT=порт')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def show(self, sender, recipients, message):
+        self.stdout.write(
+            f"{sender} -> {', '.join(recipients)}: {message['Subject']}"
+        )
+
+    def handle(self, *args, **options):
+        server = SMTPStub(options['host'], options['port'], self.show)
+        self.stdout.write(self.style.SUCCESS(
+            f'SMTP-заглушка слушает {options["host"]}:{server.port}'
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -1,3 +1,38 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди QueuedEmailBackend; DEAD — письма, которые так
+    и не удалось отправить (их можно вернуть в очередь: mail_status)."""
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUSES = [
+        (QUEUED, 'в очереди'),
+        (SENDING, 'отправляется'),
+        (SENT, 'отправлено'),
+        (DEAD, 'не доставлено'),
+    ]
+
+    message = models.BinaryField()
+    subject = models.CharField(max_length=255, blank=True, default='')
+    recipients = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    batch = models.CharField(max_length=32, blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    send_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'send_after'],
+                         name='users_email_status'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {self.recipients} [{self.status}]'
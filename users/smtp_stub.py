@@ -0,0 +1,79 @@
+import email
+import socketserver
+import threading
+from email import policy
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if line in (b'.\r\n', b'.\n', b''):
+                return b''.join(lines)
+            if line.startswith(b'..'):
+                line = line[1:]
+            lines.append(line)
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 yatube SMTP stub')
+        sender, recipients = None, []
+        for raw in self.rfile:
+            command = raw.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 stub')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                message = email.message_from_bytes(self.read_data(),
+                                                   policy=policy.default)
+                self.server.receive(sender, recipients, message)
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """SMTP-сервер для разработки и тестов: принимает письма и ничего
+    не отправляет. Письма копятся в `messages` как (отправитель,
+    получатели, email.message.EmailMessage), `connections` считает сеансы."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, on_message=None):
+        super().__init__((host, port), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.on_message = on_message
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def receive(self, sender, recipients, message):
+        self.messages.append((sender, recipients, message))
+        if self.on_message is not None:
+            self.on_message(sender, recipients, message)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -1,3 +1,193 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core import mail as django_mail
+from django.core.mail import send_mail, send_mass_mail
+from django.core.management import call_command
+from django.db.utils import ConnectionDoesNotExist
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import jobs
+from posts.models import Job
+from users import mail
+from users.backends import CachedModelBackend, forget_user, user_cache_key
+from users.models import OutgoingEmail
+from users.smtp_stub import SMTPStub
+from yatube.routers import PrimaryReplicaRouter
+
+User = get_user_model()
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+@override_settings(
+    EMAIL_BACKEND='users.mail.QueuedEmailBackend',
+    EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    JOBS_EAGER=False,
+)
+class QueuedEmailTests(TestCase):
+    def setUp(self):
+        self.worker = jobs.Worker('test')
+
+    def send(self, count=1):
+        send_mass_mail([
+            (f'Письмо {number}', 'текст', 'from@yatube.ru', ['to@yatube.ru'])
+            for number in range(count)
+        ])
+
+    def test_send_only_queues(self):
+        self.send(2)
+        self.assertEqual(len(django_mail.outbox), 0)
+        self.assertEqual(
+            OutgoingEmail.objects.filter(status=OutgoingEmail.QUEUED).count(),
+            2,
+        )
+        self.assertTrue(Job.objects.filter(
+            task='users.mail.deliver_pending'
+        ).exists())
+        self.worker.run_one()
+        self.assertEqual(len(django_mail.outbox), 2)
+        self.assertEqual(django_mail.outbox[0].subject, 'Письмо 0')
+        self.assertEqual(
+            OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 2
+        )
+
+    def test_delivery_job_is_coalesced(self):
+        self.send()
+        self.send()
+        retry = timezone.now() + timedelta(minutes=5)
+        Job.objects.update(run_at=retry)
+        self.send()
+        job = Job.objects.get(task='users.mail.deliver_pending')
+        # Новое письмо подтягивает отложенный повтор, а не ставит задачу.
+        self.assertLess(job.run_at, retry)
+
+        self.worker.run_one()
+        self.assertEqual(len(django_mail.outbox), 3)
+        self.send()
+        self.assertEqual(Job.objects.filter(
+            task='users.mail.deliver_pending', status=Job.QUEUED
+        ).count(), 1)
+
+    def test_batch_uses_one_smtp_connection(self):
+        stub = SMTPStub().start()
+        self.addCleanup(stub.stop)
+        self.send(3)
+        with self.settings(EMAIL_DELIVERY_BACKEND=SMTP_BACKEND,
+                           EMAIL_HOST='127.0.0.1', EMAIL_PORT=stub.port,
+                           EMAIL_BATCH_SIZE=10):
+            self.assertEqual(mail.deliver_pending(), 3)
+        self.assertEqual(stub.connections, 1)
+        self.assertEqual(len(stub.messages), 3)
+        self.assertEqual(stub.messages[2][2]['Subject'], 'Письмо 2')
+
+    @override_settings(EMAIL_MAX_ATTEMPTS=2)
+    def test_failures_retry_then_dead_letter(self):
+        self.send()
+        with self.settings(EMAIL_DELIVERY_BACKEND=SMTP_BACKEND,
+                           EMAIL_HOST='127.0.0.1', EMAIL_PORT=1,
+                           EMAIL_TIMEOUT=1):
+            self.assertEqual(mail.deliver_pending(), 0)
+            email = OutgoingEmail.objects.get()
+            self.assertEqual((email.status, email.attempts),
+                             (OutgoingEmail.QUEUED, 1))
+            self.assertTrue(email.last_error)
+
+            OutgoingEmail.objects.update(send_after=email.created)
+            mail.deliver_pending()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts),
+                         (OutgoingEmail.DEAD, 2))
+        self.assertEqual(mail.delivery_stats()[OutgoingEmail.DEAD], 1)
+
+        out = StringIO()
+        call_command('mail_status', '--retry-dead', '--deliver', stdout=out)
+        self.assertIn('Возвращено в очередь: 1', out.getvalue())
+        self.assertIn('Отправлено: 1', out.getvalue())
+        self.assertEqual(len(django_mail.outbox), 1)
+
+    def test_no_retry_job_when_retries_were_taken(self):
+        # Другой воркер успел забрать повторы: в очереди пусто.
+        self.send()
+        Job.objects.all().delete()
+        with mock.patch.object(mail, 'deliver', return_value=(0, 1)):
+            self.assertEqual(mail.deliver_pending(), 0)
+        self.assertFalse(Job.objects.exists())
+
+    def test_password_reset_is_queued(self):
+        User.objects.create_user('reader', 'reader@yatube.ru', 'secret-123')
+        response = Client().post(reverse('password_reset'),
+                                 {'email': 'reader@yatube.ru'})
+        self.assertEqual(response.status_code, 302)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.recipients, 'reader@yatube.ru')
+        self.assertEqual(len(django_mail.outbox), 0)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_delivers_inline(self):
+        send_mail('Тема', 'текст', 'from@yatube.ru', ['to@yatube.ru'])
+        self.assertEqual(len(django_mail.outbox), 1)
+        stats = mail.delivery_stats()
+        self.assertEqual(stats[OutgoingEmail.SENT], 1)
+        self.assertEqual(stats['sent_last_hour'], 1)
+
+
+class CachedAuthTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('reader', password='secret-123')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(CachedAuthTests.user)
+        self.url = reverse('about:author')
+
+    def test_warm_request_makes_no_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_user_save_refreshes_cache(self):
+        user = User.objects.create_user('writer')
+        backend = CachedModelBackend()
+        backend.get_user(user.pk)
+        user.first_name = 'Лев'
+        user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(user.pk).first_name, 'Лев')
+        user_id = user.pk
+        user.delete()
+        self.assertIsNone(backend.get_user(user_id))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_cache_fill_reads_primary(self):
+        user = User.objects.create_user('writer')
+        backend = CachedModelBackend()
+        # Чтения идут на реплику, которой в тестах нет: загрузка мимо
+        # основной базы упала бы с ConnectionDoesNotExist.
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read',
+                               return_value='replica'):
+            with self.assertRaises(ConnectionDoesNotExist):
+                User.objects.get(pk=user.pk)
+            User.objects.filter(pk=user.pk).update(first_name='Лев')
+            forget_user(user.pk)
+            self.assertEqual(backend.get_user(user.pk).first_name, 'Лев')
+            self.assertEqual(
+                cache.get(user_cache_key(user.pk)).first_name, 'Лев'
+            )
+
+    def test_password_change_ends_other_sessions(self):
+        user = User.objects.create_user('writer', password='secret-123')
+        self.client.force_login(user)
+        self.client.get(self.url)
+        user.set_password('another-456')
+        user.save()
+        response = self.client.get(self.url)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
@@ -0,0 +1,260 @@
+import gc
+import json
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts import jobs, search, timeline
+from posts.counters import (
+    reconcile_comment_counts, repair_group_stats, repair_user_stats,
+)
+from posts.models import Comment, Follow, Group, Post
+from yatube.instrumentation import QueryRecorder, record_queries
+
+User = get_user_model()
+
+DEFAULT_DATASET = {
+    'users': 50,
+    'groups': 5,
+    'posts': 500,
+    'comments': 1000,
+    'follows_per_user': 10,
+    'image_ratio': 0.2,
+    'seed': 1,
+}
+
+# Однопиксельный GIF: миниатюры строятся, но почти ничего не стоят.
+IMAGE = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x01\x00\x01\x00\x00\x02\x02\x44\x01\x00\x3B'
+)
+
+
+@contextmanager
+def isolated():
+    """Локальный кеш и временный MEDIA_ROOT: прогон не трогает
+    общий кеш и файлы настоящего сайта."""
+    media_root = tempfile.mkdtemp(prefix='yatube-bench-')
+    caches = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }}
+    try:
+        with override_settings(CACHES=caches, MEDIA_ROOT=media_root):
+            yield
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def seed(dataset):
+    """Заполняет базу пакетно и достраивает производные данные теми же
+    функциями, что и команды обслуживания. Возвращает опорные объекты
+    для сценариев."""
+    rng = random.Random(dataset['seed'])
+    User.objects.bulk_create([
+        User(username=f'bench{i}', first_name='Bench', last_name=str(i))
+        for i in range(dataset['users'])
+    ])
+    users = list(User.objects.filter(username__startswith='bench'))
+    Group.objects.bulk_create([
+        Group(title=f'Group {i}', slug=f'bench-{i}', description='bench')
+        for i in range(dataset['groups'])
+    ])
+    groups = list(Group.objects.filter(slug__startswith='bench-'))
+    image = default_storage.save('posts/bench.gif', ContentFile(IMAGE))
+    words = 'lorem ipsum dolor sit amet consectetur adipiscing elit'.split()
+    Post.objects.bulk_create([
+        Post(
+            text=' '.join(rng.choice(words) for _ in range(40)),
+            author=rng.choice(users),
+            group=rng.choice(groups + [None]),
+            image=image if rng.random() < dataset['image_ratio'] else None,
+        )
+        for _ in range(dataset['posts'])
+    ])
+    posts = list(Post.objects.values_list('id', flat=True))
+    Comment.objects.bulk_create([
+        Comment(post_id=rng.choice(posts), author=rng.choice(users),
+                text=' '.join(rng.choice(words) for _ in range(12)))
+        for _ in range(dataset['comments'])
+    ])
+    Follow.objects.bulk_create([
+        Follow(user=user, author=author)
+        for user in users
+        for author in rng.sample(
+            users, min(dataset['follows_per_user'], len(users))
+        )
+        if author != user
+    ], ignore_conflicts=True)
+
+    reconcile_comment_counts()
+    repair_user_stats()
+    repair_group_stats()
+    timeline.rebuild()
+    if search.enabled():
+        search.rebuild()
+
+    post = Post.objects.order_by('-comment_count', 'id').select_related(
+        'author'
+    ).first()
+    others = User.objects.filter(
+        username__startswith='bench'
+    ).exclude(pk=post.author_id)
+    reader = others.filter(follower__isnull=False).first()
+    return {
+        'post': post,
+        'author': post.author,
+        'reader': reader,
+        'other': others.exclude(pk=reader.pk).exclude(
+            following__user=reader
+        ).first(),
+        'group': groups[0],
+    }
+
+
+def scenarios(fixtures):
+    """(имя, клиент, метод, URL, данные) для каждого URL приложений
+    posts, users и about. Подписка и отписка идут парой, чтобы
+    состояние базы повторялось от круга к кругу."""
+    post = fixtures['post']
+    author = post.author.username
+    post_kwargs = {'username': author, 'post_id': post.id}
+    other = fixtures['other'].username
+    return [
+        ('index', 'guest', 'get', reverse('index'), None),
+        ('index_legacy_page', 'guest', 'get', reverse('index') + '?page=3',
+         None),
+        ('group_list', 'guest', 'get', reverse('group_list'), None),
+        ('group_posts', 'guest', 'get',
+         reverse('group_posts', kwargs={'slug': fixtures['group'].slug}),
+         None),
+        ('search', 'guest', 'get', reverse('search') + '?q=lorem', None),
+        ('profile', 'reader', 'get',
+         reverse('profile', kwargs={'username': author}), None),
+        ('post', 'reader', 'get', reverse('post', kwargs=post_kwargs), None),
+        ('follow_index', 'reader', 'get', reverse('follow_index'), None),
+        ('new_post', 'reader', 'get', reverse('new_post'), None),
+        ('post_edit', 'author', 'get',
+         reverse('post_edit', kwargs=post_kwargs), None),
+        ('export', 'author', 'get',
+         reverse('export', kwargs={'username': author}), None),
+        ('add_comment', 'reader', 'post',
+         reverse('add_comment', kwargs=post_kwargs), {'text': 'bench'}),
+        ('profile_follow', 'reader', 'get',
+         reverse('profile_follow', kwargs={'username': other}), None),
+        ('profile_unfollow', 'reader', 'get',
+         reverse('profile_unfollow', kwargs={'username': other}), None),
+        ('signup', 'guest', 'get', reverse('signup'), None),
+        ('about_author', 'guest', 'get', reverse('about:author'), None),
+        ('about_tech', 'guest', 'get', reverse('about:tech'), None),
+    ]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+
+def _run_rounds(plan, clients, samples, repeat, warmup):
+    for round_number in range(warmup + repeat):
+        for name, role, method, url, data in plan:
+            request = getattr(clients[role], method)
+            timer = QueryRecorder()
+            with record_queries(timer):
+                started = time.perf_counter()
+                response = request(url, data) if data else request(url)
+                if response.streaming:
+                    # Потоковый ответ читает базу, пока его отдают.
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(
+                    f'{name}: {method.upper()} {url} -> '
+                    f'{response.status_code}'
+                )
+            if round_number >= warmup:
+                samples[name].append(
+                    (elapsed * 1000, timer.count, timer.seconds * 1000)
+                )
+        # Между кругами очередь разбирается, как это делал бы run_jobs.
+        jobs.run_pending()
+        gc.collect()
+
+
+def run(fixtures, repeat=20, warmup=2):
+    """Прогоняет все сценарии `warmup + repeat` кругов и возвращает
+    {имя: {queries, p50_ms, p95_ms, sql_ms}} по измеренным кругам."""
+    clients = {'guest': Client()}
+    for role in ('reader', 'author'):
+        clients[role] = Client()
+        clients[role].force_login(fixtures[role])
+    plan = scenarios(fixtures)
+    samples = {name: [] for name, *_ in plan}
+    # Сборщик мусора запускается между кругами, а не посреди замера.
+    gc.disable()
+    try:
+        _run_rounds(plan, clients, samples, repeat, warmup)
+    finally:
+        gc.enable()
+    results = {}
+    for name, rows in samples.items():
+        latencies = [row[0] for row in rows]
+        results[name] = {
+            'queries': max(row[1] for row in rows),
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'sql_ms': round(percentile([row[2] for row in rows], 0.5), 2),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance=0.5, min_delta_ms=10.0,
+            latency=True):
+    """Список регрессий относительно базовой линии.
+
+    Число запросов сравнивается строго. Задержка считается регрессией,
+    только если p95 вырос больше чем на `tolerance` и на `min_delta_ms`:
+    иначе тест ловил бы шум машины, а не код.
+    """
+    problems = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            problems.append(f'{name}: нет в базовой линии')
+            continue
+        if result['queries'] > expected['queries']:
+            problems.append(
+                f"{name}: запросов {result['queries']}, "
+                f"в базовой линии {expected['queries']}"
+            )
+        if not latency:
+            continue
+        limit = max(expected['p95_ms'] * (1 + tolerance),
+                    expected['p95_ms'] + min_delta_ms)
+        if result['p95_ms'] > limit:
+            problems.append(
+                f"{name}: p95 {result['p95_ms']} мс, "
+                f"в базовой линии {expected['p95_ms']} мс"
+            )
+    return problems
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(path, dataset, results):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'dataset': dataset, 'views': results}, file,
+                  indent=2, sort_keys=True, ensure_ascii=False)
+        file.write('\n')
@@ -0,0 +1,281 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite (WAL), общий для всех процессов на одном хосте.
+
+    Лучше всего класть файл в tmpfs (/dev/shm): тогда это разделяемая
+    память без внешнего сервера. Поддерживает атомарный `incr`, TTL
+    и LRU-вытеснение при превышении MAX_ENTRIES. Число записей ведут
+    триггеры в таблице cache_size, чтобы запись не делала COUNT(*).
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    # Отметку LRU обновляем не чаще раза в секунду на ключ, чтобы
+    # чтения не превращались в запись на каждом попадании.
+    lru_resolution = 1.0
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._busy_timeout = int(options.get('BUSY_TIMEOUT', 5000))
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self._path,
+            timeout=self._busy_timeout / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute(f'PRAGMA busy_timeout = {self._busy_timeout}')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value BLOB NOT NULL,'
+            ' expires REAL,'
+            ' accessed REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+        )
+        self._create_counter(conn)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _create_counter(conn):
+        # В транзакции: счётчик, заполненный по уже существующему файлу,
+        # и триггеры появляются разом, без пропущенных между ними записей.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_size ('
+                ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+                ' entries INTEGER NOT NULL)'
+            )
+            conn.execute(
+                'INSERT OR IGNORE INTO cache_size'
+                ' SELECT 0, COUNT(*) FROM cache'
+            )
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS cache_size_insert'
+                ' AFTER INSERT ON cache BEGIN'
+                ' UPDATE cache_size SET entries = entries + 1; END'
+            )
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS cache_size_delete'
+                ' AFTER DELETE ON cache BEGIN'
+                ' UPDATE cache_size SET entries = entries - 1; END'
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _expiry(self, timeout):
+        # BaseCache уже возвращает абсолютное время истечения (или None).
+        return self.get_backend_timeout(timeout)
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        return conn
+
+    def _fetch(self, conn, key, now):
+        row = conn.execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= now:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return None
+        return row[0]
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value, accessed FROM cache WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)', (key, now)
+        ).fetchone()
+        if row is None:
+            return default
+        if now - row[1] > self.lru_resolution:
+            conn.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key)
+            )
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_key(key, version=version): key for key in keys}
+        for key in key_map:
+            self.validate_key(key)
+        if not key_map:
+            return {}
+        conn = self._connection()
+        now = time.time()
+        placeholders = ', '.join('?' * len(key_map))
+        rows = conn.execute(
+            f'SELECT key, value, accessed FROM cache'
+            f' WHERE key IN ({placeholders})'
+            ' AND (expires IS NULL OR expires > ?)',
+            (*key_map, now),
+        ).fetchall()
+        stale = [(now, key) for key, _, accessed in rows
+                 if now - accessed > self.lru_resolution]
+        if stale:
+            conn.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale
+            )
+        return {key_map[key]: pickle.loads(value) for key, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        conn = self._transaction()
+        try:
+            # UPSERT, а не INSERT OR REPLACE: замена удаляла бы строку
+            # без срабатывания триггера и сбивала счётчик.
+            conn.execute(
+                'INSERT INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET'
+                ' value = excluded.value, expires = excluded.expires,'
+                ' accessed = excluded.accessed',
+                (key, self._dumps(value), self._expiry(timeout), time.time()),
+            )
+            self._cull(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        conn = self._transaction()
+        try:
+            now = time.time()
+            if self._fetch(conn, key, now) is not None:
+                conn.execute('COMMIT')
+                return False
+            conn.execute(
+                'INSERT INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                (key, self._dumps(value), self._expiry(timeout), now),
+            )
+            self._cull(conn)
+            conn.execute('COMMIT')
+            return True
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        conn = self._connection()
+        cursor = conn.execute(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)',
+            (self._expiry(timeout), time.time(), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        conn = self._transaction()
+        try:
+            now = time.time()
+            raw = self._fetch(conn, key, now)
+            if raw is None:
+                raise ValueError(f"Key '{key}' not found")
+            new_value = pickle.loads(raw) + delta
+            conn.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (self._dumps(new_value), now, key),
+            )
+            conn.execute('COMMIT')
+            return new_value
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        self._connection().executemany(
+            'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]
+        )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединения живут весь срок процесса: открывать файл на каждый
+        # запрос дороже, чем держать его открытым.
+        pass
+
+    def _count(self, conn):
+        return conn.execute('SELECT entries FROM cache_size').fetchone()[0]
+
+    def _cull(self, conn):
+        count = self._count(conn)
+        if count <= self._max_entries:
+            return
+        conn.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),),
+        )
+        count = self._count(conn)
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            conn.execute('DELETE FROM cache')
+            return
+        conn.execute(
+            'DELETE FROM cache WHERE key IN ('
+            ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (max(count // self._cull_frequency, count - self._max_entries),),
+        )
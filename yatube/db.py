@@ -0,0 +1,77 @@
+import os
+import random
+import sqlite3
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """PRAGMA из SQLITE_PRAGMAS для каждого нового соединения SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and any(
+        message in str(error) for message in LOCK_MESSAGES
+    )
+
+
+def retry_write(func, *args, **kwargs):
+    """Вызывает `func` в транзакции, повторяя её при блокировке базы.
+
+    В WAL писатель ждёт busy_timeout, но транзакция, которая сначала
+    читала, а потом пишет, получает «database is locked» сразу: SQLite
+    не ждёт, чтобы не получить взаимную блокировку. Такую транзакцию
+    целиком повторяем с экспоненциальной паузой и случайным разбросом
+    не больше DB_WRITE_RETRIES раз.
+    """
+    delay = settings.DB_WRITE_RETRY_DELAY
+    for attempt in range(settings.DB_WRITE_RETRIES + 1):
+        try:
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if not is_lock_error(error) or (
+                    attempt == settings.DB_WRITE_RETRIES):
+                raise
+        time.sleep(delay * random.uniform(0.5, 1.5))
+        delay = min(delay * 2, settings.DB_WRITE_RETRY_MAX_DELAY)
+
+
+def retry_create(instance):
+    """retry_write для нового объекта. После отката повтор должен снова
+    вставлять строку: иначе save() сделал бы UPDATE с id из первой
+    попытки, и post_save решил бы, что объект не новый."""
+    def create():
+        instance.pk = None
+        instance._state.adding = True
+        instance.save()
+    retry_write(create)
+
+
+def copy_database(source, target, pages=1024):
+    """Копирует файл SQLite через backup API: в отличие от копирования
+    файла, получается согласованный снимок даже во время записи.
+    Страницы переносятся пачками, так что писатели основной базы
+    не ждут всю копию."""
+    directory = os.path.dirname(target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst, pages=pages)
+    finally:
+        dst.close()
+        src.close()
@@ -0,0 +1,159 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('yatube.requests')
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """Объявляет, сколько SQL-запросов может сделать представление.
+
+    Проверяет InstrumentationMiddleware: в тестах превышение — ошибка,
+    в остальных случаях — предупреждение в журнале.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class QueryRecorder:
+    """execute_wrapper: число запросов, время в базе и повторы.
+
+    Точки сохранения транзакций не считаются: их число зависит от того,
+    идёт ли запрос внутри внешней транзакции (как в тестах) или нет.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            if 'SAVEPOINT' not in sql[:20].upper():
+                self.count += 1
+                # Параметры уже вынесены в %s, так что одинаковый текст
+                # означает один и тот же запрос с разными значениями.
+                self.fingerprints[sql] += 1
+
+    def duplicates(self):
+        return [(sql, count) for sql, count in self.fingerprints.most_common()
+                if count > 1]
+
+
+@contextmanager
+def record_queries(recorder):
+    """Подключает `recorder` ко всем базам из DATABASES: чтения с реплик
+    считаются вместе с запросами к основной базе."""
+    with ExitStack() as stack:
+        for db in connections.all():
+            stack.enter_context(db.execute_wrapper(recorder))
+        yield recorder
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats = getattr(_local, 'stats', None)
+            if stats is not None:
+                stats['template'] += time.perf_counter() - started
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, засекающий время рендеринга страницы."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class InstrumentationMiddleware:
+    """Считает запросы, время в базе и в шаблонах для каждого запроса.
+
+    Итоги уходят в заголовок Server-Timing и одной JSON-строкой в журнал
+    `yatube.requests`; бюджет запросов представления (`query_budget`)
+    проверяется здесь же.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        _local.stats = {'template': 0.0}
+        request.query_budget = None
+        started = time.perf_counter()
+        try:
+            with record_queries(recorder):
+                response = self.get_response(request)
+        finally:
+            template_seconds = _local.stats['template']
+            _local.stats = None
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.seconds * 1000:.2f};'
+            f'desc="{recorder.count} queries"',
+            f'tpl;dur={template_seconds * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        duplicates = recorder.duplicates()
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(recorder.seconds * 1000, 2),
+            'template_ms': round(template_seconds * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': [
+                {'sql': sql[:200], 'count': count}
+                for sql, count in duplicates[:5]
+            ],
+        }, ensure_ascii=False))
+        self.check_budget(request, recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+
+    def check_budget(self, request, recorder):
+        budget = request.query_budget
+        if budget is None or recorder.count <= budget:
+            return
+        message = (
+            f'{request.method} {request.path}: {recorder.count} SQL-запросов '
+            f'при бюджете {budget}'
+        )
+        duplicates = recorder.duplicates()
+        if duplicates:
+            sql, count = duplicates[0]
+            message += f'; повторяется {count} раз: {sql[:200]}'
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,143 @@
+import logging
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'yatube.profiling'
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = 'profile'
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def make_token():
+    """Подписанный токен для заголовка `X-Profile`."""
+    return signing.dumps('profile', salt=TOKEN_SALT)
+
+
+def valid_token(token):
+    try:
+        signing.loads(token, salt=TOKEN_SALT,
+                      max_age=settings.PROFILER_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def frame_label(frame):
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{frame.f_globals.get('__name__', '?')}.{name}"
+
+
+class Sampler:
+    """Раз в `interval` секунд снимает стек указанного потока.
+
+    Работает в отдельном потоке через sys._current_frames(), поэтому
+    профилируемый код не замедляется трассировкой каждого вызова.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(labels))] += 1
+
+
+def get_writer():
+    """Журнал со свёрнутыми стеками, свой файл у каждого процесса.
+
+    Файлы ротируются по размеру (PROFILER_MAX_BYTES), старые копии
+    получают суффиксы .1, .2 и т.д.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.pid != os.getpid():
+            os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+            path = os.path.join(settings.PROFILER_DIR,
+                                f'stacks-{os.getpid()}.collapsed')
+            handler = RotatingFileHandler(
+                path,
+                maxBytes=settings.PROFILER_MAX_BYTES,
+                backupCount=settings.PROFILER_BACKUP_COUNT,
+                encoding='utf-8',
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            writer = logging.Logger(f'yatube.profiling.{os.getpid()}')
+            writer.propagate = False
+            writer.addHandler(handler)
+            writer.pid = os.getpid()
+            _writer = writer
+        return _writer
+
+
+def write_stacks(root, stacks):
+    """Пишет стеки в формате collapsed (flamegraph.pl, speedscope);
+    первым кадром идёт `root`, чтобы отделять запросы друг от друга."""
+    lines = [f'{root};{stack} {count}' for stack, count in stacks.items()]
+    if lines:
+        get_writer().info('\n'.join(lines))
+
+
+class ProfilerMiddleware:
+    """Сэмплирующий профайлер по требованию.
+
+    Запрос профилируется, если сотрудник добавил `?profile=1`, если пришёл
+    заголовок `X-Profile` с токеном из `manage.py profiler_token` или
+    если запрос попал в случайную долю PROFILER_SAMPLE_RATE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        if settings.PROFILER_SAMPLE_RATE and (
+                random.random() < settings.PROFILER_SAMPLE_RATE):
+            return True
+        token = request.META.get(HEADER)
+        if token and valid_token(token):
+            return True
+        user = getattr(request, 'user', None)
+        return (QUERY_FLAG in request.GET and user is not None
+                and user.is_staff)
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        sampler = Sampler(threading.get_ident(), settings.PROFILER_INTERVAL)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        view = getattr(request.resolver_match, 'view_name', None)
+        write_stacks(f'{request.method} {view or request.path}',
+                     sampler.stacks)
+        response['X-Profile-Samples'] = str(sum(sampler.stacks.values()))
+        return response
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+PRIMARY = 'default'
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_local = threading.local()
+
+
+def is_pinned():
+    # Вне запроса (команды, фоновые потоки) реплика не используется:
+    # импорт и обслуживание должны видеть свежие данные.
+    return getattr(_local, 'pinned', True)
+
+
+def _synced_key(alias):
+    return f'replicas:synced:{alias}'
+
+
+def mark_synced(alias, started):
+    """Реплика содержит все записи, закоммиченные до `started`."""
+    cache.set(_synced_key(alias), started, timeout=None)
+
+
+def note_writes(keys):
+    """Отмечает закоммиченную запись в данные, помеченные ключами `keys`
+    (например, по ключу на область кеша лент)."""
+    cache.set_many(dict.fromkeys(keys, time.time()), timeout=None)
+
+
+def use_replicas_fresh_for(keys):
+    """Остаток запроса читает только с реплик, скопированных после
+    последней записи по любому из ключей `keys`.
+
+    Нужен страницам, которые кладут прочитанное в общий кеш под ключом,
+    уже учитывающим запись (фрагменты лент, ETag): старые данные
+    с отставшей реплики остались бы там до истечения таймаута.
+    Записи в другие области на выбор реплики не влияют.
+    """
+    replicas = getattr(_local, 'replicas', ())
+    if is_pinned() or not replicas:
+        return
+    synced = {_synced_key(alias): alias for alias in replicas}
+    values = cache.get_many([*keys, *synced])
+    missing = [key for key in keys if key not in values]
+    if missing:
+        # Отметка потеряна: неизвестно, что реплики успели скопировать.
+        # Читаем с основной базы до следующего обновления реплик.
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        _local.replicas = []
+        return
+    since = max((values[key] for key in keys), default=0)
+    _local.replicas = [alias for key, alias in synced.items()
+                       if values.get(key, -1) >= since]
+
+
+def pin_primary(request):
+    """Для безопасных запросов, которые всё же пишут (подписка по
+    ссылке): остаток запроса и следующие запросы клиента читают
+    с основной базы так же, как после POST."""
+    _local.pinned = True
+    request.pinned_primary = True
+
+
+class PrimaryReplicaRouter:
+    """Чтения в безопасных запросах — на случайную реплику из
+    DATABASE_REPLICAS, всё остальное — на основную базу. Страницы
+    с общим кешем сужают выбор до свежих реплик: use_replicas_fresh_for.
+
+    На основную базу идут и чтения внутри транзакции (иначе
+    get_or_create читал бы с реплики), и все запросы клиента, который
+    недавно что-то записал: см. ReplicaPinMiddleware.
+    """
+
+    def db_for_read(self, model, **hints):
+        if is_pinned():
+            return PRIMARY
+        replicas = getattr(_local, 'replicas', ())
+        if not replicas or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными из основной базы.
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaPinMiddleware:
+    """«Читай свои записи»: изменяющий запрос и все запросы клиента
+    в течение READ_YOUR_WRITES_SECONDS после успешной записи читают
+    с основной базы, пока реплика не догнала её.
+
+    Отметка хранится в cookie, поэтому работает с любым числом процессов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = request.method not in SAFE_METHODS
+        _local.pinned = writes or PIN_COOKIE in request.COOKIES
+        _local.replicas = [] if _local.pinned else list(
+            settings.DATABASE_REPLICAS
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            del _local.pinned, _local.replicas
+        writes = writes or getattr(request, 'pinned_primary', False)
+        if writes and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.READ_YOUR_WRITES_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import importlib.util
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -45,27 +46,34 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    "debug_toolbar",
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
+    'yatube.instrumentation.InstrumentationMiddleware',
+    'yatube.routers.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'yatube.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# debug_toolbar только для разработки и только если он установлен:
+# под нагрузкой он лишь замедляет каждый запрос
+if DEBUG and importlib.util.find_spec('debug_toolbar') is not None:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.instrumentation.InstrumentedTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -85,13 +93,34 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Профиль базы: YATUBE_DB_PROFILE=production включает WAL, настройки
+# SQLite под нагрузку и постоянные соединения (см. SQLITE_PRAGMAS)
+DB_PROFILE = os.environ.get('YATUBE_DB_PROFILE', 'development')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get(
+            'YATUBE_DB_PATH', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        'CONN_MAX_AGE': 600 if DB_PROFILE == 'production' else 0,
     }
 }
 
+# Реплика только для чтения: YATUBE_DB_REPLICA=путь к копии SQLite,
+# которую обновляет manage.py refresh_replica. В тестах реплика
+# совпадает с основной базой
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_DB_REPLICA'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.environ['YATUBE_DB_REPLICA'],
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append('replica')
+
+DATABASE_ROUTERS = ['yatube.routers.PrimaryReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -135,19 +164,155 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') 
 
+# Картинки постов хранятся по sha256 содержимого; хеш считает
+# posts.uploads.HashingUploadHandler в представлениях с картинками
+DEFAULT_FILE_STORAGE = 'posts.storage.ContentAddressedStorage'
+POST_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+
+# Производные картинок постов, которые строятся сразу после загрузки
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Процессы для массовой генерации миниатюр (manage.py generate_thumbnails);
+# после загрузки миниатюры строит задача очереди
+THUMBNAIL_WORKERS = 2
+# Сколько метаданных миниатюр держать в памяти каждого процесса
+THUMBNAIL_LRU_SIZE = 2048
+
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index" 
 #LOGOUT_REDIRECT_URL = "index"  
 
-EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+# Письма сохраняются в базу и уходят из воркера очереди через
+# EMAIL_DELIVERY_BACKEND (см. users.mail). YATUBE_EMAIL_DELIVERY_BACKEND,
+# YATUBE_EMAIL_HOST и YATUBE_EMAIL_PORT переключают доставку, например
+# на SMTP-заглушку manage.py smtp_stub
+EMAIL_BACKEND = "users.mail.QueuedEmailBackend"
+EMAIL_DELIVERY_BACKEND = os.environ.get(
+    "YATUBE_EMAIL_DELIVERY_BACKEND",
+    "django.core.mail.backends.filebased.EmailBackend",
+)
+EMAIL_HOST = os.environ.get("YATUBE_EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.environ.get("YATUBE_EMAIL_PORT", 25))
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# Общий для всех воркеров кеш: файл SQLite в разделяемой памяти (tmpfs)
+CACHE_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else BASE_DIR
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'yatube-cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
     }
-} 
+}
 
 INTERNAL_IPS = [
     "127.0.0.1",
-] 
\ No newline at end of file
+] 
+
+# Глубина материализованной ленты подписок на пользователя
+TIMELINE_DEPTH = 500
+
+# Время жизни фрагментов лент; свежесть обеспечивают поколения кеша
+FEED_CACHE_TTL = 60 * 60
+
+# Комментариев на одной странице поста
+COMMENTS_PER_PAGE = 50
+
+# Превышение бюджета запросов (@query_budget) — предупреждение в журнале
+# yatube.requests; в тестах ошибка (yatube.test_settings)
+QUERY_BUDGET_STRICT = False
+
+# Журнал запросов: по строке JSON с числом SQL-запросов и временем
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'yatube.mail': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Сэмплирующий профайлер: куда писать свёрнутые стеки, как часто снимать
+# стек, какую долю запросов профилировать без запроса и размер файлов
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILER_INTERVAL = 0.005
+PROFILER_SAMPLE_RATE = 0
+PROFILER_MAX_BYTES = 10 * 1024 * 1024
+PROFILER_BACKUP_COUNT = 5
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+
+# Выгрузка данных пользователя: сколько строк читать из базы за раз
+EXPORT_CHUNK_SIZE = 2000
+
+# Сколько секунд процесс помнит соответствие slug -> группа; изменение
+# группы сбрасывает кеш всех процессов раньше (posts.group_cache)
+GROUP_CACHE_TTL = 60
+
+# Групп на странице каталога
+GROUPS_PER_PAGE = 20
+
+# PRAGMA для каждого нового соединения SQLite. WAL не даёт читателям
+# ждать писателя, synchronous=NORMAL в WAL не теряет целостность,
+# mmap и кеш страниц (в КиБ, со знаком минус) ускоряют чтения
+SQLITE_PRAGMAS = {'busy_timeout': 5000}
+if DB_PROFILE == 'production':
+    SQLITE_PRAGMAS.update({
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    })
+
+# Повторы записи при «database is locked»: сколько раз, первая пауза
+# и её потолок в секундах (пауза удваивается)
+DB_WRITE_RETRIES = 5
+DB_WRITE_RETRY_DELAY = 0.05
+DB_WRITE_RETRY_MAX_DELAY = 1.0
+
+# Сколько секунд после записи клиент читает с основной базы, а не с реплики
+READ_YOUR_WRITES_SECONDS = 10
+
+# Очередь задач (posts.jobs, manage.py run_jobs). YATUBE_JOBS_EAGER=1
+# выполняет задачи сразу при постановке, без воркера; по умолчанию
+# (и в тестах) задачи идут через очередь
+JOBS_EAGER = os.environ.get('YATUBE_JOBS_EAGER') == '1'
+JOB_WORKERS = 2
+JOB_MAX_ATTEMPTS = 5
+# Пауза перед повтором удваивается от JOB_RETRY_DELAY до потолка, секунд
+JOB_RETRY_DELAY = 5
+JOB_RETRY_MAX_DELAY = 600
+# Через сколько секунд задача умершего воркера возвращается в очередь
+JOB_LEASE = 300
+# Сколько секунд хранить выполненные задачи (и их ключи идемпотентности)
+JOB_RETENTION = 24 * 60 * 60
+# Сколько кандидатов перебирает воркер, если задачу перехватили
+JOB_CLAIM_BATCH = 5
+
+# Доставка писем: размер пачки на одно соединение, число попыток до
+# переноса в недоставленные и паузы между ними (удваиваются), секунд
+EMAIL_BATCH_SIZE = 100
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_DELAY = 60
+EMAIL_RETRY_MAX_DELAY = 3600
+
+# Сессии читаются из общего кеша, база остаётся источником истины;
+# пользователь сессии тоже берётся из кеша (users.backends)
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+USER_CACHE_TTL = 60 * 5
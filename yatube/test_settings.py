@@ -0,0 +1,21 @@
+"""Настройки для тестов: `manage.py test` и pytest (см. pytest.ini)."""
+from .settings import *  # noqa: F401,F403
+
+# Свой кеш в памяти процесса: общий файл кеша сайта тесты не читают
+# и не засоряют
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
+# Превышение бюджета запросов — ошибка, а не предупреждение
+QUERY_BUDGET_STRICT = True
+
+# Журналы запросов и почты: только предупреждения
+LOGGING['loggers']['yatube.requests']['level'] = 'WARNING'  # noqa: F405
+LOGGING['loggers']['yatube.mail']['level'] = 'WARNING'  # noqa: F405
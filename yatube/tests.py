@@ -0,0 +1,436 @@
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection, connections
+from django.db.models.signals import post_save
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+
+from posts.feed_cache import bump_generation, read_fresh
+from posts.models import Post
+from yatube import benchmark, profiling
+from yatube.cache import SQLiteCache
+from yatube.db import copy_database, retry_create, retry_write
+from yatube.routers import (
+    PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinMiddleware, mark_synced,
+    pin_primary,
+)
+from yatube.instrumentation import (
+    InstrumentationMiddleware, QueryBudgetExceeded, query_budget,
+)
+
+User = get_user_model()
+
+
+def incr_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertEqual(self.cache.get_many(['key', 'missing']),
+                         {'key': {'value': 1}})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_and_expiry(self):
+        self.assertTrue(self.cache.add('key', 1, timeout=0.05))
+        self.assertFalse(self.cache.add('key', 2))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 3))
+        self.assertEqual(self.cache.get('key'), 3)
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        self.cache.lru_resolution = 0
+        for i in range(10):
+            self.cache.set(f'key{i}', i)
+        self.cache.get('key0')
+        self.cache.set('key10', 10)
+        self.assertEqual(self.cache.get('key0'), 0)
+        self.assertIsNone(self.cache.get('key1'))
+        self.assertLessEqual(len(self.cache.get_many(
+            [f'key{i}' for i in range(11)])), 10)
+
+    def test_entry_count_maintained(self):
+        self.cache.set('key', 1)
+        self.cache.set('key', 2)
+        self.cache.add('other', 1)
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.cache.delete('a')
+        conn = self.cache._connection()
+        self.assertEqual(self.cache._count(conn), 3)
+        # Счётчик для файла, созданного до его появления.
+        conn.execute('DROP TABLE cache_size')
+        conn.execute('DROP TRIGGER cache_size_insert')
+        conn.execute('DROP TRIGGER cache_size_delete')
+        self.cache._create_counter(conn)
+        self.assertEqual(self.cache._count(conn), 3)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        workers = [
+            multiprocessing.Process(target=incr_many,
+                                    args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+
+class BenchmarkBaselineTests(TestCase):
+    """Число запросов на каждой странице не выше базовой линии.
+
+    Задержки здесь не сравниваются: они зависят от машины, их проверяет
+    `manage.py benchmark`.
+    """
+
+    def test_query_counts_within_baseline(self):
+        path = os.path.join(settings.BASE_DIR, 'yatube',
+                            'benchmark_baseline.json')
+        baseline = benchmark.load_baseline(path)
+        with benchmark.isolated():
+            fixtures = benchmark.seed(baseline['dataset'])
+            results = benchmark.run(fixtures, repeat=1, warmup=1)
+        self.assertEqual(
+            benchmark.compare(results, baseline['views'], latency=False), []
+        )
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_view(self, view):
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        middleware = InstrumentationMiddleware(get_response)
+        return middleware(self.factory.get('/'))
+
+    def test_server_timing_and_log_line(self):
+        @query_budget(2)
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return render(request, 'misc/404.html', {'path': '/'})
+
+        with self.assertLogs('yatube.requests', level='INFO') as logs:
+            response = self.run_view(view)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], 2)
+        self.assertEqual(record['duplicates'][0]['count'], 2)
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_replica_queries_are_counted(self):
+        default = connections['default']
+        replica = type(default)(
+            dict(default.settings_dict, NAME=':memory:'), 'replica'
+        )
+        self.addCleanup(replica.close)
+
+        @query_budget(1)
+        def view(request):
+            list(User.objects.all())
+            with replica.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return HttpResponse()
+
+        with mock.patch('yatube.instrumentation.connections.all',
+                        return_value=[default, replica]), \
+                self.assertRaises(QueryBudgetExceeded):
+            self.run_view(view)
+
+    def test_budget_violation_raises_in_strict_mode(self):
+        @query_budget(1)
+        def view(request):
+            for _ in range(3):
+                User.objects.filter(pk=1).exists()
+            return HttpResponse()
+
+        with override_settings(QUERY_BUDGET_STRICT=True), \
+                self.assertRaises(QueryBudgetExceeded):
+            self.run_view(view)
+        with override_settings(QUERY_BUDGET_STRICT=False), \
+                self.assertLogs('yatube.requests', level='WARNING'):
+            self.run_view(view)
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            PROFILER_DIR=self.directory, PROFILER_INTERVAL=0.0001,
+        )
+        self.settings_override.enable()
+        profiling._writer = None
+
+    def tearDown(self):
+        self.settings_override.disable()
+        profiling._writer = None
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stacks(self):
+        lines = []
+        for name in os.listdir(self.directory):
+            with open(os.path.join(self.directory, name),
+                      encoding='utf-8') as file:
+                lines.extend(file.read().splitlines())
+        return lines
+
+    def test_signed_header_enables_profiling(self):
+        response = self.client.get('/', HTTP_X_PROFILE=profiling.make_token())
+        self.assertIn('X-Profile-Samples', response)
+        self.assertTrue(all(
+            line.startswith('GET index;') for line in self.stacks()
+        ))
+
+    def test_sampler_sees_running_code(self):
+        def busy_loop():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = profiling.Sampler(threading.get_ident(), 0.001)
+        sampler.start()
+        busy_loop()
+        sampler.stop()
+        profiling.write_stacks('GET test', sampler.stacks)
+        self.assertIn('busy_loop', '\n'.join(self.stacks()))
+
+    def test_query_flag_requires_staff(self):
+        user = User.objects.create(username='visitor')
+        self.client.force_login(user)
+        response = self.client.get('/?profile=1')
+        self.assertNotIn('X-Profile-Samples', response)
+        user.is_staff = True
+        user.save()
+        response = self.client.get('/?profile=1')
+        self.assertIn('X-Profile-Samples', response)
+
+    def test_forged_token_is_ignored(self):
+        response = self.client.get('/', HTTP_X_PROFILE='profile:forged')
+        self.assertNotIn('X-Profile-Samples', response)
+        self.assertEqual(self.stacks(), [])
+
+    @override_settings(PROFILER_MAX_BYTES=200, PROFILER_BACKUP_COUNT=2)
+    def test_files_rotate_by_size(self):
+        stacks = {'a;b;c' * 10: 1}
+        for _ in range(10):
+            profiling.write_stacks('GET index', stacks)
+        names = os.listdir(self.directory)
+        self.assertEqual(len(names), 3)
+
+
+@override_settings(DB_WRITE_RETRY_DELAY=0.001)
+class DatabaseProfileTests(TestCase):
+    def test_pragmas_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0],
+                             settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    @override_settings(SQLITE_PRAGMAS={
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 100,
+    })
+    def test_production_pragmas_enable_wal(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_dict = dict(connection.settings_dict,
+                             NAME=os.path.join(directory, 'wal.sqlite3'))
+        wrapper = type(connections['default'])(settings_dict, 'wal-check')
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)
+        finally:
+            wrapper.close()
+
+    def test_retry_write_retries_lock_errors(self):
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(retry_write(flaky), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    @override_settings(DB_WRITE_RETRIES=2)
+    def test_retry_write_gives_up(self):
+        calls = []
+
+        def locked():
+            calls.append(1)
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            retry_write(locked)
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_not_retried(self):
+        calls = []
+
+        def broken():
+            calls.append(1)
+            raise OperationalError('no such table: missing')
+
+        with self.assertRaises(OperationalError):
+            retry_write(broken)
+        self.assertEqual(len(calls), 1)
+
+    def test_retry_create_inserts_again_after_rollback(self):
+        author = User.objects.create(username='writer')
+        created_flags = []
+
+        def lock_once(sender, instance, created, **kwargs):
+            created_flags.append(created)
+            if len(created_flags) == 1:
+                raise OperationalError('database is locked')
+
+        post_save.connect(lock_once, sender=Post)
+        self.addCleanup(post_save.disconnect, lock_once, sender=Post)
+        retry_create(Post(text='retry', author=author))
+        self.assertEqual(created_flags, [True, True])
+        self.assertEqual(Post.objects.filter(text='retry').count(), 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    # Отметки записей в кеш ставятся через transaction.on_commit.
+    databases = {'default'}
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+        bump_generation('replica-test:a', 'replica-test:b')
+        mark_synced('replica', time.time())
+
+    def read_alias(self, request, status=200, scopes=None):
+        seen = []
+
+        def view(request):
+            if scopes is not None:
+                read_fresh(scopes)
+            seen.append(self.router.db_for_read(Post))
+            return HttpResponse(status=status)
+
+        response = ReplicaPinMiddleware(view)(request)
+        return seen[0], response
+
+    def test_safe_requests_read_from_replica(self):
+        alias, response = self.read_alias(self.factory.get('/'))
+        self.assertEqual(alias, 'replica')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_reads_after_write_use_primary(self):
+        alias, response = self.read_alias(self.factory.post('/'))
+        self.assertEqual(alias, 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'],
+                         settings.READ_YOUR_WRITES_SECONDS)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        alias, _ = self.read_alias(request)
+        self.assertEqual(alias, 'default')
+
+    def test_cached_scopes_skip_replica_copied_before_their_writes(self):
+        get = self.factory.get
+        alias, _ = self.read_alias(get('/'), scopes=['replica-test:a'])
+        self.assertEqual(alias, 'replica')
+
+        # Запись в область a делает реплику устаревшей только для неё.
+        bump_generation('replica-test:a')
+        alias, _ = self.read_alias(get('/'), scopes=['replica-test:a'])
+        self.assertEqual(alias, 'default')
+        alias, _ = self.read_alias(get('/'), scopes=['replica-test:b'])
+        self.assertEqual(alias, 'replica')
+        alias, _ = self.read_alias(get('/'))
+        self.assertEqual(alias, 'replica')
+
+        mark_synced('replica', time.time())
+        alias, _ = self.read_alias(get('/'), scopes=['replica-test:a'])
+        self.assertEqual(alias, 'replica')
+
+    def test_lost_write_mark_uses_primary(self):
+        alias, _ = self.read_alias(self.factory.get('/'),
+                                   scopes=['replica-test:unknown'])
+        self.assertEqual(alias, 'default')
+
+    def test_pin_primary_on_safe_request(self):
+        seen = []
+
+        def view(request):
+            pin_primary(request)
+            seen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = ReplicaPinMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(seen, ['default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_failed_write_does_not_pin(self):
+        _, response = self.read_alias(self.factory.post('/'), status=400)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+
+    def test_copy_database(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, 'primary.sqlite3')
+        target = os.path.join(directory, 'replica', 'replica.sqlite3')
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE t (value INTEGER)')
+            db.execute('INSERT INTO t VALUES (42)')
+        db.close()
+        copy_database(source, target)
+        db = sqlite3.connect(target)
+        self.addCleanup(db.close)
+        self.assertEqual(db.execute('SELECT value FROM t').fetchone(), (42,))